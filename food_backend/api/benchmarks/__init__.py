@@ -0,0 +1,117 @@
+"""Бенчмарки горячих эндпоинтов.
+
+Каждый модуль пакета описывает один бенчмарк функциями
+``add_arguments(parser)`` и ``run(options) -> dict`` и запускается
+командой ``python manage.py benchmark <name>``. Данные создаются во
+временной тестовой базе, рабочая база не затрагивается.
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment
+)
+
+BENCHMARKS = {
+    'pagination': 'api.benchmarks.pagination',
+    'checkout': 'api.benchmarks.checkout',
+    'uploads': 'api.benchmarks.uploads',
+    'promo_codes': 'api.benchmarks.promo_codes',
+    'connections': 'api.benchmarks.connections',
+    'endpoints': 'api.benchmarks.endpoints',
+}
+# Метрики, по которым результат сравнивается с базовым; True — больше лучше.
+COMPARED_METRICS = {
+    'mean_ms': False,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'queries_per_run': False,
+    'queries_per_request': False,
+    'requests_per_second': True,
+}
+
+
+@contextmanager
+def isolated_database(keepdb=False):
+    """Создает тестовую базу на время бенчмарка."""
+    old_name = connection.settings_dict['NAME']
+    setup_test_environment()
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, keepdb=keepdb
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summarize(timings):
+    """Статистика по списку длительностей в секундах, результат в мс."""
+    return {
+        'runs': len(timings),
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3),
+    }
+
+
+def measure(func, repeat):
+    """Вызывает ``func`` ``repeat`` раз, считая время и SQL-запросы."""
+    timings = []
+    with CaptureQueriesContext(connection) as ctx:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+    result = summarize(timings)
+    result['queries_per_run'] = len(ctx.captured_queries) / repeat
+    return result
+
+
+def compare(result, baseline, threshold, path=''):
+    """Сравнивает результат с базовым, возвращает изменения и регрессии.
+
+    Регрессия — ухудшение метрики из ``COMPARED_METRICS`` больше чем на
+    ``threshold`` процентов или метрика, которой больше нет (``None``).
+    """
+    changes, regressions = {}, []
+    for key, value in result.items():
+        if key not in baseline:
+            continue
+        name = f'{path}.{key}' if path else key
+        if isinstance(value, dict) and isinstance(baseline[key], dict):
+            nested_changes, nested_regressions = compare(
+                value, baseline[key], threshold, name
+            )
+            changes.update(nested_changes)
+            regressions.extend(nested_regressions)
+        elif key in COMPARED_METRICS and baseline[key] and value is None:
+            # Метрика пропала, например все запросы сценария завершились ошибкой.
+            changes[name] = {
+                'baseline': baseline[key], 'current': None, 'change_pct': None
+            }
+            regressions.append(name)
+        elif key in COMPARED_METRICS and baseline[key]:
+            change = (value - baseline[key]) / baseline[key] * 100
+            changes[name] = {
+                'baseline': baseline[key],
+                'current': value,
+                'change_pct': round(change, 1),
+            }
+            if (-change if COMPARED_METRICS[key] else change) > threshold:
+                regressions.append(name)
+    return changes, regressions
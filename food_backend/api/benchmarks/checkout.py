@@ -0,0 +1,58 @@
+"""Латентность оформления заказа в зависимости от размера корзины."""
+import time
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from food.models import Cart, CartItem, Category, CustomUser, Product
+from . import summarize
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1, 10, 40, 100],
+        help='Размеры корзины (число позиций)'
+    )
+    parser.add_argument('--repeat', type=int, default=20)
+
+
+def run(options):
+    sizes = options['sizes']
+    category = Category.objects.create(name='Бенчмарк', slug='benchmark')
+    Product.objects.bulk_create(
+        Product(
+            name=f'Товар {i}', slug=f'benchmark-product-{i}',
+            price=Decimal('10.00'), category=category
+        )
+        for i in range(max(sizes))
+    )
+    products = list(Product.objects.order_by('id'))
+    user = CustomUser.objects.create_user(
+        username='benchmark', password='benchmark', address='Адрес',
+        first_name='Имя', last_name='Фамилия'
+    )
+    cart, _ = Cart.objects.get_or_create(user=user)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    results = {}
+    for size in sizes:
+        timings, queries = [], 0
+        for _ in range(options['repeat']):
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product=product, quantity=2)
+                for product in products[:size]
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = client.post('/v1/orders/create-from-cart/')
+                timings.append(time.perf_counter() - started)
+            assert response.status_code == 201, response.data
+            queries += len(ctx.captured_queries)
+        results[f'items_{size}'] = {
+            **summarize(timings),
+            'queries_per_run': queries / options['repeat'],
+        }
+    return results
@@ -0,0 +1,103 @@
+"""Латентность коротких запросов при разных режимах соединений с БД.
+
+``close`` — соединение открывается и закрывается на каждый запрос (как
+без ``CONN_MAX_AGE``), ``persistent`` — постоянное соединение на поток,
+``pool`` — пул соединений процесса из ``food_backend.db``. Каждый поток
+имитирует воркер: делает запросы к ``promo-codes/`` и после каждого
+закрывает устаревшие соединения, как это делает WSGI-сервер. Разница
+заметна на настоящем PostgreSQL, где соединение стоит TCP и авторизации.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+from rest_framework.test import APIClient
+
+from food.models import CustomUser
+from . import summarize
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        '--modes', nargs='+', default=['close', 'persistent', 'pool'],
+        choices=['close', 'persistent', 'pool']
+    )
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Запросов на поток')
+    parser.add_argument(
+        '--pool-size', type=int, default=4,
+        help='Размер пула; меньше числа потоков, чтобы было ожидание'
+    )
+
+
+def mode_settings(mode, options):
+    if mode == 'close':
+        return {'CONN_MAX_AGE': 0, 'POOL': None}
+    if mode == 'persistent':
+        return {'CONN_MAX_AGE': 600, 'POOL': None}
+    return {
+        'CONN_MAX_AGE': 0,
+        'POOL': {'MAX_SIZE': options['pool_size'], 'TIMEOUT': 30},
+    }
+
+
+def run_mode(mode, user, options):
+    settings_dict = {
+        **connections.databases['default'], **mode_settings(mode, options)
+    }
+    backend = load_backend(settings_dict['ENGINE'])
+    opened = []
+
+    def count_connection(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    def worker():
+        connections['default'] = backend.DatabaseWrapper(settings_dict, 'default')
+        client = APIClient()
+        client.force_authenticate(user)
+        timings = []
+        try:
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                response = client.get('/v1/promo-codes/')
+                close_old_connections()
+                timings.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.status_code
+        finally:
+            connections['default'].close()
+        return timings
+
+    connection_created.connect(count_connection)
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(worker) for _ in range(options['workers'])]
+            timings = [timing for future in futures for timing in future.result()]
+    finally:
+        connection_created.disconnect(count_connection)
+    elapsed = time.perf_counter() - started
+
+    result = {
+        **summarize(timings),
+        'requests_per_second': round(len(timings) / elapsed),
+        'connections_opened': len(opened),
+    }
+    pool = getattr(backend, 'get_pool', lambda settings_dict: None)(settings_dict)
+    if pool is not None:
+        result['pool'] = pool.stats()
+        pool.close_idle()
+    return result
+
+
+def run(options):
+    user = CustomUser.objects.create_user(username='benchmark', password='benchmark')
+    engine = connections.databases['default']['ENGINE']
+    results = {'engine': engine, 'workers': options['workers']}
+    for mode in options['modes']:
+        if mode == 'pool' and not hasattr(load_backend(engine), 'get_pool'):
+            results[mode] = {'skipped': f'{engine} не поддерживает пул'}
+            continue
+        results[mode] = run_mode(mode, user, options)
+    return results
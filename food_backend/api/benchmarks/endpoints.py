@@ -0,0 +1,177 @@
+"""Горячие эндпоинты API на большом синтетическом наборе данных.
+
+Каждый сценарий сначала выполняется последовательно в текущем потоке,
+затем параллельно в ``--workers`` потоках, у каждого из которых свое
+соединение с БД и свои пользователи. Число SQL-запросов берется из
+``RequestMetricsMiddleware``, поэтому считается и в потоках.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from food.models import Cart, CartItem, Product
+from . import summarize
+from .seed import NOUNS, add_arguments as add_seed_arguments, seed_dataset, seeded_users
+
+
+def product_list(context, user, rng):
+    return 'get', f'/v1/products/?limit=24&offset={rng.randrange(0, 10) * 24}', None
+
+
+def product_search(context, user, rng):
+    return 'get', f'/v1/products/?limit=24&search={rng.choice(NOUNS)}', None
+
+
+def cart_add(context, user, rng):
+    return 'post', '/v1/cart/add/', {'product': rng.choice(context['slugs'])}
+
+
+def cart_list(context, user, rng):
+    return 'get', '/v1/cart/', None
+
+
+def checkout(context, user, rng):
+    return 'post', '/v1/orders/create-from-cart/', {}
+
+
+def refill_carts(context, users, rng):
+    # Каждый пользователь оформляет заказ не больше раза за прогон,
+    # корзины наполняются заранее и вне замера.
+    carts = Cart.objects.filter(user__in=users).values_list('id', flat=True)
+    CartItem.objects.bulk_create(
+        (
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=1)
+            for cart_id in carts
+            for product_id in rng.sample(context['product_ids'], 3)
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def order_history(context, user, rng):
+    return 'get', '/v1/orders/', None
+
+
+def promo_current(context, user, rng):
+    return 'get', '/v1/promo-codes/current/', None
+
+
+SCENARIOS = {
+    'product_list': product_list,
+    'product_search': product_search,
+    'cart_add': cart_add,
+    'cart_list': cart_list,
+    'checkout': checkout,
+    'order_history': order_history,
+    'promo_current': promo_current,
+}
+PREPARE = {
+    'checkout': refill_carts,
+}
+
+
+def add_arguments(parser):
+    add_seed_arguments(parser)
+    parser.add_argument(
+        '--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS)
+    )
+    parser.add_argument('--requests', type=int, default=200, help='Запросов на сценарий')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument(
+        '--cache', action='store_true', help='Не отключать кэш ответов каталога'
+    )
+
+
+def run_requests(scenario, context, users, count, rng):
+    users = rng.sample(users, len(users))
+    clients = {}
+    timings, queries, errors = [], [], 0
+    for i in range(count):
+        user = users[i % len(users)]
+        if user.pk not in clients:
+            # Ошибка сервера (например, блокировка в SQLite) считается в errors.
+            clients[user.pk] = APIClient(raise_request_exception=False)
+            clients[user.pk].force_authenticate(user)
+        method, url, data = scenario(context, user, rng)
+        started = time.perf_counter()
+        response = getattr(clients[user.pk], method)(url, data, format='json')
+        timings.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+        else:
+            queries.append(response.wsgi_request.request_metrics.queries)
+    return timings, queries, errors
+
+
+def report(timings, queries, errors, elapsed):
+    return {
+        **summarize(timings),
+        'requests_per_second': round(len(timings) / elapsed, 1),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'max_queries': max(queries, default=None),
+        'errors': errors,
+    }
+
+
+def run_sequential(scenario, context, users, options):
+    rng = random.Random(options['seed'])
+    started = time.perf_counter()
+    timings, queries, errors = run_requests(
+        scenario, context, users, options['requests'], rng
+    )
+    return report(timings, queries, errors, time.perf_counter() - started)
+
+
+def run_concurrent(scenario, context, users, options):
+    workers = min(options['workers'], len(users))
+
+    def worker(index):
+        # Пользователи не пересекаются: потоки не ждут блокировок одной корзины.
+        rng = random.Random(options['seed'] + index)
+        try:
+            return run_requests(
+                scenario, context, users[index::workers],
+                max(options['requests'] // workers, 1), rng
+            )
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(worker, range(workers)))
+    elapsed = time.perf_counter() - started
+    return report(
+        [timing for result in results for timing in result[0]],
+        [count for result in results for count in result[1]],
+        sum(result[2] for result in results),
+        elapsed,
+    )
+
+
+def run(options):
+    dataset = seed_dataset(options)
+    users = list(seeded_users())
+    context = {
+        'product_ids': list(Product.objects.values_list('id', flat=True)),
+        'slugs': list(Product.objects.values_list('slug', flat=True)[:1000]),
+    }
+
+    results = {
+        'dataset': {**dataset, 'seed': options['seed']},
+        'workers': min(options['workers'], len(users)),
+        'scenarios': {},
+    }
+    cache_settings = {} if options['cache'] else {'CATALOG_CACHE_TIMEOUT': 0}
+    with override_settings(**cache_settings):
+        for name in options['scenarios']:
+            scenario, prepare = SCENARIOS[name], PREPARE.get(name)
+            results['scenarios'][name] = {}
+            for mode, runner in (('sequential', run_sequential), ('concurrent', run_concurrent)):
+                if prepare:
+                    prepare(context, users, random.Random(options['seed']))
+                results['scenarios'][name][mode] = runner(scenario, context, users, options)
+    return results
@@ -0,0 +1,62 @@
+"""Сравнение limit/offset и cursor-пагинации каталога на глубокой странице."""
+from base64 import b64encode
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from food.models import Category, Product
+from ..pagination import ProductCursorPagination
+from . import measure
+
+
+def add_arguments(parser):
+    parser.add_argument('--page', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=24)
+    parser.add_argument('--repeat', type=int, default=20)
+
+
+def seed(count, batch_size=2000):
+    category = Category.objects.create(name='Бенчмарк', slug='benchmark')
+    for start in range(0, count, batch_size):
+        Product.objects.bulk_create(
+            Product(
+                name=f'Товар {i}',
+                slug=f'benchmark-product-{i}',
+                price=Decimal('10.00'),
+                category=category,
+            )
+            for i in range(start, min(start + batch_size, count))
+        )
+
+
+def encode_cursor(position):
+    # Тот же формат, что у CursorPagination.encode_cursor.
+    querystring = urlencode({'p': position}, doseq=True)
+    return b64encode(querystring.encode('ascii')).decode('ascii')
+
+
+@override_settings(CATALOG_CACHE_TIMEOUT=0)
+def run(options):
+    page, limit = options['page'], options['limit']
+    offset = (page - 1) * limit
+    seed(offset + limit)
+
+    paginator = ProductCursorPagination()
+    last_before_page = Product.objects.order_by(*paginator.ordering)[offset - 1]
+    cursor = encode_cursor(
+        paginator._get_position_from_instance(last_before_page, paginator.ordering)
+    )
+    client = APIClient()
+    urls = {
+        'limit_offset': f'/v1/products/?limit={limit}&offset={offset}',
+        'cursor': f'/v1/products/?limit={limit}&cursor={cursor}',
+    }
+
+    results = {'page': page, 'limit': limit, 'products': offset + limit}
+    for mode, url in urls.items():
+        response = client.get(url)
+        assert len(response.data['results']) == limit, mode
+        results[mode] = measure(lambda: client.get(url), options['repeat'])
+    return results
@@ -0,0 +1,51 @@
+"""Скорость выпуска промокодов: пачками через PromoCode.mint и по одному."""
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from food.models import PromoCode
+
+
+def add_arguments(parser):
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument(
+        '--batch-sizes', type=int, nargs='+', default=[1000, 5000, 20000]
+    )
+    parser.add_argument(
+        '--single-count', type=int, default=1000,
+        help='Сколько кодов создать по одному для сравнения'
+    )
+
+
+def run(options):
+    expires_at = timezone.now() + timedelta(days=30)
+    results = {'count': options['count']}
+
+    started = time.perf_counter()
+    for _ in range(options['single_count']):
+        PromoCode.objects.create(
+            code=PromoCode.generate_code(), campaign='single',
+            discount_percent=10, expires_at=expires_at
+        )
+    elapsed = time.perf_counter() - started
+    results['single'] = {
+        'codes': options['single_count'],
+        'seconds': round(elapsed, 3),
+        'codes_per_second': round(options['single_count'] / elapsed),
+    }
+
+    for batch_size in options['batch_sizes']:
+        started = time.perf_counter()
+        for _ in PromoCode.mint(
+            options['count'], discount_percent=10, expires_at=expires_at,
+            campaign=f'batch-{batch_size}', batch_size=batch_size
+        ):
+            pass
+        elapsed = time.perf_counter() - started
+        results[f'batch_{batch_size}'] = {
+            'codes': options['count'],
+            'seconds': round(elapsed, 3),
+            'codes_per_second': round(options['count'] / elapsed),
+        }
+    return results
@@ -0,0 +1,176 @@
+"""Синтетический набор данных для нагрузочных бенчмарков.
+
+Набор воспроизводим: одинаковые параметры и ``--seed`` дают те же
+товары, отзывы, корзины и заказы. Все создается через ``bulk_create``,
+поэтому сигналы не срабатывают — счетчики рейтинга заполняются здесь же,
+а поисковый вектор на PostgreSQL пишет триггер.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from food.models import (
+    Cart, CartItem, Category, CustomUser, Order, OrderItem, Product, ProductImage,
+    PromoCode, Review
+)
+
+USERNAME = 'bench-user-{}'
+PASSWORD = 'benchmark'
+NOUNS = (
+    'яблоко', 'банан', 'сыр', 'хлеб', 'молоко', 'кофе', 'чай', 'рис',
+    'паста', 'соус', 'йогурт', 'мед', 'орехи', 'шоколад', 'сок', 'печенье',
+)
+ADJECTIVES = (
+    'свежий', 'домашний', 'фермерский', 'органический', 'сладкий',
+    'копченый', 'классический', 'отборный',
+)
+
+
+def add_arguments(parser):
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--images-per-product', type=int, default=1)
+    parser.add_argument('--reviews-per-product', type=int, default=2)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--cart-items', type=int, default=3, help='Позиций в корзине')
+    parser.add_argument('--orders-per-user', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=2000)
+
+
+def seed_dataset(options):
+    """Создает набор данных, возвращает число созданных объектов."""
+    rng = random.Random(options['seed'])
+    batch_size = options['batch_size']
+
+    categories = Category.objects.bulk_create(
+        Category(name=f'Категория {i}', slug=f'bench-category-{i}')
+        for i in range(options['categories'])
+    )
+    category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+
+    # Один хэш на всех: make_password на тысячи пользователей — минуты.
+    password = make_password(PASSWORD)
+    CustomUser.objects.bulk_create(
+        (
+            CustomUser(
+                username=USERNAME.format(i), password=password,
+                first_name='Имя', last_name='Фамилия', address=f'Улица {i}'
+            )
+            for i in range(options['users'])
+        ),
+        batch_size=batch_size,
+    )
+    user_ids = list(
+        CustomUser.objects.filter(username__startswith='bench-user-')
+        .order_by('id').values_list('id', flat=True)
+    )
+
+    # Отзывы выбираются заранее, чтобы сразу записать счетчики рейтинга.
+    reviews = []
+    products = []
+    for i in range(options['products']):
+        reviewers = rng.sample(user_ids, min(options['reviews_per_product'], len(user_ids)))
+        ratings = [rng.randint(1, 5) for _ in reviewers]
+        reviews.append(list(zip(reviewers, ratings)))
+        products.append(Product(
+            name=f'{rng.choice(ADJECTIVES).capitalize()} {rng.choice(NOUNS)} {i}',
+            slug=f'bench-product-{i}',
+            description=f'{rng.choice(NOUNS)} {rng.choice(NOUNS)}',
+            price=Decimal(rng.randint(50, 5000)) / 10,
+            category_id=rng.choice(category_ids) if category_ids else None,
+            rating_sum=sum(ratings),
+            rating_count=len(ratings),
+        ))
+    Product.objects.bulk_create(products, batch_size=batch_size)
+    product_rows = list(
+        Product.objects.order_by('id').values_list('id', 'name', 'slug', 'price')
+    )
+    product_ids = [row[0] for row in product_rows]
+
+    ProductImage.objects.bulk_create(
+        (
+            ProductImage(product_id=product_id, image=f'product_images/bench-{n}.jpg')
+            for product_id in product_ids
+            for n in range(options['images_per_product'])
+        ),
+        batch_size=batch_size,
+    )
+    Review.objects.bulk_create(
+        (
+            Review(user_id=user_id, product_id=product_id, rating=rating, text='Отзыв')
+            for product_id, product_reviews in zip(product_ids, reviews)
+            for user_id, rating in product_reviews
+        ),
+        batch_size=batch_size,
+    )
+
+    Cart.objects.bulk_create(
+        (Cart(user_id=user_id) for user_id in user_ids), batch_size=batch_size
+    )
+    cart_ids = list(Cart.objects.order_by('id').values_list('id', flat=True))
+    cart_items = min(options['cart_items'], len(product_ids))
+    CartItem.objects.bulk_create(
+        (
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 3))
+            for cart_id in cart_ids
+            for product_id in rng.sample(product_ids, cart_items)
+        ),
+        batch_size=batch_size,
+    )
+
+    order_lines = []
+    orders = []
+    for user_id in user_ids:
+        for _ in range(options['orders_per_user']):
+            lines = [
+                (rng.choice(product_rows), rng.randint(1, 3))
+                for _ in range(rng.randint(1, 3))
+            ] if product_rows else []
+            order_lines.append(lines)
+            orders.append(Order(
+                user_id=user_id,
+                delivery_address='Адрес',
+                total_price=sum(row[3] * quantity for row, quantity in lines),
+            ))
+    Order.objects.bulk_create(orders, batch_size=batch_size)
+    order_ids = Order.objects.order_by('id').values_list('id', flat=True)
+    OrderItem.objects.bulk_create(
+        (
+            OrderItem(
+                order_id=order_id, product_id=row[0], product_name=row[1],
+                product_slug=row[2], quantity=quantity, price_per_item=row[3]
+            )
+            for order_id, lines in zip(order_ids, order_lines)
+            for row, quantity in lines
+        ),
+        batch_size=batch_size,
+    )
+
+    # Промокод на сегодня у половины пользователей: current отдает готовый.
+    expires_at = timezone.now() + timedelta(days=1)
+    PromoCode.objects.bulk_create(
+        (
+            PromoCode(
+                user_id=user_id, code=f'BENCH{user_id}', discount_percent=10,
+                expires_at=expires_at
+            )
+            for user_id in user_ids[::2]
+        ),
+        batch_size=batch_size,
+    )
+
+    return {
+        'categories': len(categories),
+        'products': len(product_ids),
+        'users': len(user_ids),
+        'reviews': Review.objects.count(),
+        'orders': len(orders),
+    }
+
+
+def seeded_users():
+    return CustomUser.objects.filter(username__startswith='bench-user-').order_by('id')
@@ -0,0 +1,104 @@
+"""Пиковая память при загрузке картинки: base64 в JSON против multipart.
+
+Память считается через tracemalloc вокруг вызова view, то есть
+учитываются аллокации Python-объектов на стороне сервера: разобранное
+тело, декодированный base64, буферы парсеров.
+Построение WebP-вариантов на время замера отключается, чтобы сравнивать
+только путь загрузки.
+"""
+import base64
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.signals import post_save
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from food.models import CustomUser, Product, ProductImage
+from food.signals import build_image_variants
+from ..views import ProductImageViewSet
+from . import summarize
+
+
+def add_arguments(parser):
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=5)
+
+
+def make_image(width, height):
+    # Шум плохо сжимается, поэтому файл по размеру близок к реальной фотографии.
+    noise = Image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+    buffer = BytesIO()
+    noise.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+@contextmanager
+def upload_environment():
+    media_root = tempfile.mkdtemp()
+    post_save.disconnect(build_image_variants, sender=ProductImage)
+    try:
+        with override_settings(
+            MEDIA_ROOT=media_root,
+            IMAGE_UPLOAD_MAX_SIZE=1024 ** 3,
+            IMAGE_UPLOAD_MAX_DIMENSION=100000,
+        ):
+            yield
+    finally:
+        post_save.connect(build_image_variants, sender=ProductImage)
+        shutil.rmtree(media_root)
+
+
+def run(options):
+    content = make_image(options['width'], options['height'])
+    product = Product.objects.create(
+        name='Бенчмарк', slug='benchmark', price=Decimal('10.00')
+    )
+    admin = CustomUser.objects.create_superuser(username='admin', password='admin')
+    factory = APIRequestFactory()
+    encoded = base64.b64encode(content).decode('ascii')
+    builders = {
+        'base64': lambda: factory.post(
+            '/v1/images/', {'product': product.name, 'image': encoded},
+            format='json'
+        ),
+        'multipart': lambda: factory.post(
+            '/v1/images/',
+            {
+                'product': product.name,
+                'image': SimpleUploadedFile('photo.jpg', content, 'image/jpeg'),
+            },
+            format='multipart'
+        ),
+    }
+    view = ProductImageViewSet.as_view({'post': 'create'})
+
+    results = {'file_bytes': len(content)}
+    with upload_environment():
+        for mode, build in builders.items():
+            timings, peaks = [], []
+            for _ in range(options['repeat']):
+                # Тело запроса собирается заранее и в замер не входит.
+                request = build()
+                force_authenticate(request, admin)
+                tracemalloc.start()
+                started = time.perf_counter()
+                response = view(request)
+                timings.append(time.perf_counter() - started)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+                assert response.status_code == 201, response.data
+            results[mode] = {
+                **summarize(timings),
+                'peak_memory_mb': round(max(peaks) / 1024 ** 2, 2),
+            }
+    return results
@@ -0,0 +1,138 @@
+"""Кэш GET-ответов каталога.
+
+Каждый закэшированный ответ зависит от набора "областей" (``products``,
+``product:<pk>``, ``category-products:<slug>`` и т.д.). У каждой области
+есть версия, которая входит в ключ ответа; сигналы моделей после коммита
+увеличивают версии затронутых областей, и старые ответы просто перестают
+читаться.
+
+Если запрос уже прошел через ``conditional_catalog``, в ключ идут версии
+областей из базы: тогда тело ответа всегда соответствует ETag, даже когда
+у каждого воркера свой локальный кэш.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from food.models import CatalogVersion
+from .metrics import CATALOG_CACHE_REQUESTS
+
+VERSION_KEY = 'catalog:version:{scope}'
+RESPONSE_KEY = 'catalog:response:{digest}'
+STATS_KEY = 'catalog:stats:{name}'
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _new_version():
+    # Версия из текущего времени: если ключ версии вытеснят из кэша,
+    # старые ответы не "воскреснут" под той же версией.
+    return int(time.time() * 1000)
+
+
+def _version_key(scope):
+    # Хэш вместо slug: ключи memcached должны быть ASCII без пробелов.
+    return VERSION_KEY.format(
+        scope=hashlib.md5(scope.encode('utf-8')).hexdigest()
+    )
+
+
+def scope_versions(scopes):
+    cache = get_cache()
+    keys = {scope: _version_key(scope) for scope in scopes}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for scope, key in keys.items():
+        if key not in stored:
+            cache.add(key, _new_version(), None)
+            stored[key] = cache.get(key)
+        versions[scope] = stored[key]
+    return versions
+
+
+def response_key(request, scopes):
+    versions = getattr(request, 'catalog_versions', None)
+    if versions is None:
+        versions = scope_versions(scopes)
+    raw = request.build_absolute_uri() + repr(sorted(versions.items()))
+    return RESPONSE_KEY.format(
+        digest=hashlib.md5(raw.encode('utf-8')).hexdigest()
+    )
+
+
+def _bump_versions(scopes):
+    version = _new_version()
+    get_cache().set_many(
+        {_version_key(scope): version for scope in scopes}, None
+    )
+    CatalogVersion.bump(*scopes)
+
+
+def invalidate(*scopes):
+    """Увеличивает версии областей после коммита текущей транзакции.
+
+    Пока транзакция не закоммичена, читатели видят старые данные; новая
+    версия раньше времени закэшировала бы их под собой.
+    """
+    scopes = set(scopes)
+    transaction.on_commit(lambda: _bump_versions(scopes))
+
+
+def _count(name):
+    cache = get_cache()
+    key = STATS_KEY.format(name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(STATS_KEY.format(name='hits'), 0)
+    misses = cache.get(STATS_KEY.format(name='misses'), 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def cache_response(*scopes):
+    """Кэширует ``response.data`` GET-метода viewset.
+
+    Области — шаблоны, подставляемые из kwargs маршрута, например
+    ``'product:{pk}'``.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = response_key(
+                request, [scope.format(**kwargs) for scope in scopes]
+            )
+            data = get_cache().get(key)
+            if data is not None:
+                _count('hits')
+                CATALOG_CACHE_REQUESTS.labels(result='hit').inc()
+                return Response(data, headers={'X-Cache': 'HIT'})
+
+            _count('misses')
+            CATALOG_CACHE_REQUESTS.labels(result='miss').inc()
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                get_cache().set(
+                    key, response.data, settings.CATALOG_CACHE_TIMEOUT
+                )
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
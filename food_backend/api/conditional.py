@@ -0,0 +1,54 @@
+"""Условные GET-запросы (ETag / Last-Modified) для каталога.
+
+Версии областей каталога хранятся в базе (``CatalogVersion``) и
+увеличиваются сигналами вместе с инвалидацией кэша. ETag считается из
+версий областей ответа, URL и заголовка Accept, поэтому 304 отдается
+одним запросом к базе, без сериализации.
+"""
+import hashlib
+
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from food.models import CatalogVersion
+from .cache import cache_response
+
+
+def _scope_state(request, scopes, kwargs):
+    if getattr(request, 'catalog_versions', None) is None:
+        scopes = [scope.format(**kwargs) for scope in scopes]
+        versions = dict.fromkeys(scopes, 0)
+        last_modified = None
+        for scope, version, updated_at in CatalogVersion.objects.filter(
+            scope__in=scopes
+        ).values_list('scope', 'version', 'updated_at'):
+            versions[scope] = version
+            last_modified = max(filter(None, (last_modified, updated_at)))
+        request.catalog_versions = versions
+        request.catalog_last_modified = last_modified
+    return request.catalog_versions, request.catalog_last_modified
+
+
+def conditional_catalog(*scopes):
+    def etag_func(request, *args, **kwargs):
+        versions, _ = _scope_state(request, scopes, kwargs)
+        raw = '{versions}:{path}:{accept}'.format(
+            versions=sorted(versions.items()),
+            path=request.get_full_path(),
+            accept=request.META.get('HTTP_ACCEPT', ''),
+        )
+        return '"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        return _scope_state(request, scopes, kwargs)[1]
+
+    return method_decorator(
+        condition(etag_func=etag_func, last_modified_func=last_modified_func)
+    )
+
+
+def catalog_response(*scopes):
+    """Условный GET поверх кэша ответов с одними и теми же областями."""
+    def decorator(view_method):
+        return conditional_catalog(*scopes)(cache_response(*scopes)(view_method))
+    return decorator
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity
+)
+from django.db import connection
+from django.db.models import F, Q
+from rest_framework import filters
+
+from food.search import is_supported, prefix_query
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """Полнотекстовый поиск по названию и описанию с ранжированием.
+
+    Каждое слово ищется как префикс, чтобы работал поиск по мере ввода;
+    опечатки в названии ловит триграммное сходство. На базах, отличных
+    от PostgreSQL, используется обычный ``SearchFilter`` по ``search_fields``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_supported(connection):
+            return super().filter_queryset(request, queryset, view)
+
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        text = ' '.join(terms)
+        # Подстрока названия — как у SearchFilter; ILIKE использует
+        # триграммный индекс по name.
+        condition = Q(name__icontains=text) | Q(name__trigram_similar=text)
+        raw_query = prefix_query(text)
+        if not raw_query:
+            return queryset.filter(condition)
+        query = SearchQuery(
+            raw_query, search_type='raw', config=settings.PRODUCT_SEARCH_CONFIG
+        )
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('name', text),
+        ).filter(
+            Q(search_vector=query) | condition
+        ).order_by('-rank', '-similarity', 'created_at', 'id')
@@ -0,0 +1,74 @@
+import json
+import logging
+import subprocess
+from importlib import import_module
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import BENCHMARKS, compare, isolated_database
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Запускает бенчмарк во временной базе и печатает результат в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', help='Файл для сохранения результата в JSON'
+        )
+        parser.add_argument(
+            '--baseline', help='Результат прошлого запуска для сравнения'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=10,
+            help='Допустимое ухудшение метрик в процентах'
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Завершиться с ошибкой, если есть регрессии'
+        )
+        subparsers = parser.add_subparsers(dest='benchmark', required=True)
+        for name, module_path in BENCHMARKS.items():
+            subparser = subparsers.add_parser(name)
+            import_module(module_path).add_arguments(subparser)
+
+    def handle(self, *args, **options):
+        # Строка лога на каждый запрос искажает замеры.
+        logging.getLogger('api.requests').setLevel(logging.WARNING)
+        module = import_module(BENCHMARKS[options['benchmark']])
+        with isolated_database():
+            result = module.run(options)
+        result = {
+            'benchmark': options['benchmark'], 'commit': current_commit(), **result
+        }
+
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as fh:
+                baseline = json.load(fh)
+            if baseline.get('benchmark') != options['benchmark']:
+                raise CommandError('Базовый результат от другого бенчмарка.')
+            changes, regressions = compare(result, baseline, options['threshold'])
+            result['comparison'] = {
+                'baseline_commit': baseline.get('commit'),
+                'threshold_pct': options['threshold'],
+                'changes': changes,
+                'regressions': regressions,
+            }
+
+        output = json.dumps(result, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(output)
+        self.stdout.write(output)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Регрессии: {", ".join(regressions)}')
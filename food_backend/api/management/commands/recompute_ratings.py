@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from api.signals import invalidate_products
+from food.models import Product, Review
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики рейтинга товаров по отзывам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        totals = {
+            row['product']: (row['rating_sum'], row['rating_count'])
+            for row in Review.objects.values('product').annotate(
+                rating_sum=Sum('rating'), rating_count=Count('id')
+            ).order_by()
+        }
+
+        fixed = 0
+        last_pk = 0
+        products = Product.objects.order_by('pk').only(
+            'pk', 'rating_sum', 'rating_count'
+        )
+        while True:
+            batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            changed = []
+            for product in batch:
+                expected = totals.get(product.pk, (0, 0))
+                if (product.rating_sum, product.rating_count) != expected:
+                    product.rating_sum, product.rating_count = expected
+                    changed.append(product)
+            if changed:
+                Product.objects.bulk_update(changed, ['rating_sum', 'rating_count'])
+                # bulk_update не вызывает сигналы: кэш каталога сбрасываем сами.
+                invalidate_products([product.pk for product in changed])
+            fixed += len(changed)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(f'Исправлено товаров: {fixed}')
@@ -0,0 +1,187 @@
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.benchmarks import percentile, summarize
+from api.benchmarks.seed import seeded_users
+
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def load_capture(path, limit=None):
+    """Читает JSONL-запись: ``method``, ``path``, необязательные ``ts``,
+    ``user``, ``body`` и ``status``. Формат совпадает с логом ``api.requests``
+    (тела JSON до ``REQUEST_LOG_BODY_MAX_SIZE``, без паролей и токенов),
+    остальные строки лога (предупреждения о бюджете) пропускаются.
+    """
+    entries, skipped = [], 0
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            if not isinstance(entry, dict) or 'method' not in entry or 'path' not in entry:
+                skipped += bool(line.strip())
+                continue
+            entries.append(entry)
+            if limit and len(entries) >= limit:
+                break
+    if all(entry.get('ts') is not None for entry in entries):
+        entries.sort(key=lambda entry: entry['ts'])
+    return entries, skipped
+
+
+def route_name(entry):
+    view = entry.get('view')
+    if not view:
+        path = urlsplit(entry['path']).path
+        try:
+            view = resolve(path).view_name
+        except Resolver404:
+            view = ID_SEGMENT.sub('/{id}', path)
+    return f'{entry["method"].upper()} {view}'
+
+
+def issue_tokens(entries):
+    """Сопоставляет пользователей записи тестовым аккаунтам и выдает им JWT."""
+    captured = list(dict.fromkeys(
+        entry['user'] for entry in entries if entry.get('user') is not None
+    ))
+    if not captured:
+        return {}
+    accounts = list(seeded_users()[:len(captured)])
+    if not accounts:
+        raise CommandError('Нет тестовых пользователей: запустите seed_benchmark_data.')
+    # Пользователей в записи может быть больше, чем аккаунтов: тогда по кругу.
+    return {
+        user: str(AccessToken.for_user(accounts[index % len(accounts)]))
+        for index, user in enumerate(captured)
+    }
+
+
+class Command(BaseCommand):
+    help = 'Воспроизводит записанный трафик API и печатает латентность по маршрутам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', help='JSONL-файл с записанными запросами')
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--speed', type=float, default=1.0,
+            help='Ускорение относительно записи по полю ts; 0 — без пауз'
+        )
+        parser.add_argument('--limit', type=int, help='Воспроизвести первые N запросов')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', help='Файл для сохранения отчета в JSON')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] <= 0 or options['speed'] < 0:
+            raise CommandError('Нужны concurrency > 0 и speed >= 0.')
+        entries, skipped = load_capture(options['capture'], options['limit'])
+        if not entries:
+            raise CommandError('Запись пуста.')
+        tokens = issue_tokens(entries)
+        base_url = options['base_url'].rstrip('/')
+
+        def send(entry, scheduled_at):
+            lag = time.monotonic() - scheduled_at
+            body = entry.get('body')
+            request = Request(
+                base_url + entry['path'],
+                data=None if body is None else json.dumps(body).encode('utf-8'),
+                method=entry['method'].upper(),
+            )
+            request.add_header('Content-Type', 'application/json')
+            if entry.get('user') is not None:
+                request.add_header('Authorization', f'Bearer {tokens[entry["user"]]}')
+            started = time.perf_counter()
+            try:
+                with urlopen(request, timeout=options['timeout']) as response:
+                    response.read()
+                    status = response.status
+            except HTTPError as exc:
+                exc.read()
+                status = exc.code
+            except (URLError, OSError):
+                status = None
+            return time.perf_counter() - started, status, lag
+
+        results, elapsed = self.replay(
+            entries, send, options['concurrency'], options['speed']
+        )
+        report = {'skipped_lines': skipped, **self.report(entries, results, elapsed)}
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(output)
+        self.stdout.write(output)
+
+    def replay(self, entries, send, concurrency, speed):
+        first_ts = entries[0].get('ts')
+        paced = speed and first_ts is not None
+        # В очереди не больше двух запросов на поток: при перегрузке сервера
+        # отставание от расписания видно в schedule_lag_ms, а не в памяти.
+        slots = threading.BoundedSemaphore(concurrency * 2)
+
+        def run(entry, scheduled_at):
+            try:
+                return send(entry, scheduled_at)
+            finally:
+                slots.release()
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = []
+            for entry in entries:
+                scheduled_at = time.monotonic()
+                if paced:
+                    scheduled_at = started + (entry['ts'] - first_ts) / speed
+                    delay = scheduled_at - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                slots.acquire()
+                futures.append(executor.submit(run, entry, scheduled_at))
+            results = [future.result() for future in futures]
+        return results, time.monotonic() - started
+
+    def report(self, entries, results, elapsed):
+        routes = defaultdict(lambda: {'timings': [], 'statuses': defaultdict(int)})
+        errors = mismatches = 0
+        for entry, (duration, status, lag) in zip(entries, results):
+            route = routes[route_name(entry)]
+            route['timings'].append(duration)
+            route['statuses'][str(status)] += 1
+            if status is None or status >= 500:
+                errors += 1
+            if entry.get('status') is not None and entry['status'] != status:
+                mismatches += 1
+
+        lags = [max(lag, 0) for _, _, lag in results]
+        return {
+            'requests': len(results),
+            'duration_s': round(elapsed, 3),
+            'requests_per_second': round(len(results) / elapsed, 1),
+            'errors': errors,
+            # Ответ отличается от записанного: другие данные или регрессия.
+            'status_mismatches': mismatches,
+            'schedule_lag_ms': {
+                'p50': round(percentile(lags, 50) * 1000, 3),
+                'p95': round(percentile(lags, 95) * 1000, 3),
+                'max': round(max(lags) * 1000, 3),
+            },
+            'routes': {
+                name: {**summarize(route['timings']), 'statuses': dict(route['statuses'])}
+                for name, route in sorted(routes.items())
+            },
+        }
@@ -0,0 +1,20 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.benchmarks.seed import add_arguments, seed_dataset, seeded_users
+
+
+class Command(BaseCommand):
+    help = 'Заполняет текущую базу синтетическими данными для replay_traffic'
+
+    def add_arguments(self, parser):
+        add_arguments(parser)
+
+    def handle(self, *args, **options):
+        if seeded_users().exists():
+            raise CommandError('Тестовые данные уже есть в базе.')
+        with transaction.atomic():
+            created = seed_dataset(options)
+        self.stdout.write(json.dumps(created, ensure_ascii=False))
@@ -0,0 +1,102 @@
+"""Метрики в формате Prometheus.
+
+Под gunicorn у каждого воркера свои счетчики. Если задана переменная
+``PROMETHEUS_MULTIPROC_DIR``, prometheus_client пишет значения в файлы
+этого каталога (mmap), а ``/metrics`` собирает их со всех процессов.
+Каталог очищает и настраивает ``gunicorn.conf.py``; он же отмечает
+завершившиеся воркеры, чтобы их gauge не попадали в сумму.
+"""
+import os
+
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_LATENCY = Histogram(
+    'api_request_duration_seconds',
+    'Время обработки запроса',
+    ['view', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'api_requests_in_progress',
+    'Запросы, которые обрабатываются сейчас',
+    multiprocess_mode='livesum',
+)
+CATALOG_CACHE_REQUESTS = Counter(
+    'api_catalog_cache_requests_total',
+    'Обращения к кэшу ответов каталога',
+    ['result'],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'api_db_pool_connections',
+    'Соединения пула БД',
+    ['alias', 'state'],
+    multiprocess_mode='livesum',
+)
+CHECKOUTS = Counter(
+    'api_checkouts_total',
+    'Попытки оформить заказ из корзины',
+    ['result'],
+)
+CHECKOUT_REVENUE = Counter(
+    'api_checkout_revenue_rubles_total',
+    'Сумма оформленных заказов с учетом скидок',
+)
+PROMO_CODES_ISSUED = Counter(
+    'api_promo_codes_issued_total',
+    'Выданные ежедневные промокоды',
+    ['kind'],
+)
+PROMO_CODES_APPLIED = Counter(
+    'api_promo_codes_applied_total',
+    'Попытки применить промокод к корзине',
+    ['result'],
+)
+PROMO_CODES_REDEEMED = Counter(
+    'api_promo_codes_redeemed_total',
+    'Промокоды, использованные в заказах',
+)
+
+
+def observe_request(view_name, method, status, duration):
+    # Путь в метку не идет: у detail-маршрутов он неограниченный.
+    REQUEST_LATENCY.labels(
+        view=view_name or 'unresolved', method=method, status=str(status)
+    ).observe(duration)
+
+
+def observe_db_pools():
+    for connection in connections.all():
+        pool = getattr(connection, 'connection_pool', None)
+        if pool is None:
+            continue
+        stats = pool.stats()
+        for state in ('in_use', 'idle'):
+            DB_POOL_CONNECTIONS.labels(
+                alias=connection.alias, state=state
+            ).set(stats[state])
+
+
+def get_registry():
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Метрики всех воркеров; снаружи закрыт в nginx"""
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
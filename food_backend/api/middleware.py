@@ -0,0 +1,251 @@
+"""Замеры каждого запроса: SQL, сериализация, рендеринг ответа и его размер.
+
+Результат уходит в заголовок ``Server-Timing``, в JSON-строку лога
+``api.requests`` и в счетчики по view, которые показывает
+``request-stats/``, а время ответа — в гистограмму Prometheus
+(``api.metrics``). JSON-тела изменяющих запросов пишутся в лог без
+секретных полей, чтобы лог можно было воспроизвести ``replay_traffic``.
+Для маршрутов задается бюджет SQL-запросов (``QUERY_BUDGETS``):
+превышение пишется в лог, а в тестах — падает.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.urls import get_resolver
+
+from .metrics import REQUESTS_IN_PROGRESS, observe_db_pools, observe_request
+
+logger = logging.getLogger('api.requests')
+
+LOGGED_BODY_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+# Поля, которые не пишутся в лог ни на каком уровне вложенности.
+SENSITIVE_FIELDS = frozenset((
+    'password', 'current_password', 'new_password', 're_password',
+    're_new_password', 'token', 'access', 'refresh', 'uid',
+))
+STATS_KEY = 'request-stats:{view}:{field}'
+# Время в счетчиках хранится в микросекундах: incr работает с целыми.
+STATS_FIELDS = (
+    'requests', 'total_us', 'db_us', 'serialize_us', 'render_us', 'queries', 'bytes'
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _without_sensitive(value):
+    if isinstance(value, dict):
+        return {
+            key: _without_sensitive(item) for key, item in value.items()
+            if key not in SENSITIVE_FIELDS
+        }
+    if isinstance(value, list):
+        return [_without_sensitive(item) for item in value]
+    return value
+
+
+def loggable_body(request):
+    """JSON-тело изменяющего запроса без секретов или ``None``.
+
+    Тело читается до view только при известной длине не больше
+    ``REQUEST_LOG_BODY_MAX_SIZE``: загрузки картинок не буферизуются.
+    """
+    if request.method not in LOGGED_BODY_METHODS or request.content_type != 'application/json':
+        return None
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return None
+    if not 0 < length <= settings.REQUEST_LOG_BODY_MAX_SIZE:
+        return None
+    try:
+        return _without_sensitive(json.loads(request.body))
+    except ValueError:
+        return None
+
+
+def get_stats_cache():
+    return caches[settings.REQUEST_STATS_CACHE_ALIAS]
+
+
+def get_query_budget(view_name, method=None):
+    budgets = settings.QUERY_BUDGETS
+    if method and f'{method} {view_name}' in budgets:
+        return budgets[f'{method} {view_name}']
+    return budgets.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+
+
+def _incr(cache, key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def _record_stats(view_name, metrics):
+    cache = get_stats_cache()
+    values = {
+        'requests': 1,
+        'total_us': round(metrics.total * 1e6),
+        'db_us': round(metrics.db_time * 1e6),
+        'serialize_us': round(metrics.serialize_time * 1e6),
+        'render_us': round(metrics.render_time * 1e6),
+        'queries': metrics.queries,
+        'bytes': metrics.size or 0,
+    }
+    for field, value in values.items():
+        if value:
+            _incr(cache, STATS_KEY.format(view=view_name, field=field), value)
+    max_key = STATS_KEY.format(view=view_name, field='max_queries')
+    if metrics.queries > cache.get(max_key, 0):
+        cache.set(max_key, metrics.queries, None)
+
+
+def get_request_stats():
+    """Средние значения по каждому view, самые тяжелые по БД — первыми."""
+    view_names = sorted(
+        name for name in get_resolver().reverse_dict if isinstance(name, str)
+    )
+    keys = [
+        STATS_KEY.format(view=view_name, field=field)
+        for view_name in view_names
+        for field in STATS_FIELDS + ('max_queries',)
+    ]
+    stored = get_stats_cache().get_many(keys)
+
+    stats = []
+    for view_name in view_names:
+        values = {
+            field: stored.get(STATS_KEY.format(view=view_name, field=field), 0)
+            for field in STATS_FIELDS + ('max_queries',)
+        }
+        requests = values['requests']
+        if not requests:
+            continue
+        stats.append({
+            'view': view_name,
+            'requests': requests,
+            'avg_ms': round(values['total_us'] / requests / 1000, 3),
+            'avg_db_ms': round(values['db_us'] / requests / 1000, 3),
+            'avg_serialize_ms': round(values['serialize_us'] / requests / 1000, 3),
+            'avg_render_ms': round(values['render_us'] / requests / 1000, 3),
+            'avg_queries': round(values['queries'] / requests, 2),
+            'max_queries': values['max_queries'],
+            'avg_bytes': round(values['bytes'] / requests),
+            'query_budget': get_query_budget(view_name),
+            'db_ms_total': round(values['db_us'] / 1000, 3),
+        })
+    stats.sort(key=lambda row: row['db_ms_total'], reverse=True)
+    return stats
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        # Заполняет TimedRepresentationMixin сериализаторов.
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.render_time = 0.0
+        self.total = 0.0
+        self.size = None
+        self.started_at = time.time()
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self):
+        app_time = max(
+            self.total - self.db_time - self.serialize_time - self.render_time, 0
+        )
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'app;dur={app_time * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request.request_metrics = RequestMetrics()
+        body = loggable_body(request)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            stack.enter_context(REQUESTS_IN_PROGRESS.track_inprogress())
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics.record_query))
+            response = self.get_response(request)
+        metrics.total = time.perf_counter() - started
+        if not response.streaming:
+            metrics.size = len(response.content)
+
+        response['Server-Timing'] = metrics.server_timing()
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        self.log(request, response, view_name, metrics, body)
+        observe_request(view_name, request.method, response.status_code, metrics.total)
+        observe_db_pools()
+        if view_name:
+            _record_stats(view_name, metrics)
+            self.check_budget(request, view_name, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF-ответ рендерится сразу после этого хука.
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.request_metrics.render_time = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def log(self, request, response, view_name, metrics, body=None):
+        # Строки лога — готовая запись трафика для replay_traffic.
+        user = getattr(request, 'user', None)
+        entry = {
+            'ts': round(metrics.started_at, 3),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view_name,
+            'status': response.status_code,
+            'user': user.pk if user is not None and user.is_authenticated else None,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 3),
+            'serialize_ms': round(metrics.serialize_time * 1000, 3),
+            'render_ms': round(metrics.render_time * 1000, 3),
+            'total_ms': round(metrics.total * 1000, 3),
+            'bytes': metrics.size,
+        }
+        if body is not None:
+            entry['body'] = body
+        logger.info(json.dumps(entry, ensure_ascii=False))
+
+    def check_budget(self, request, view_name, metrics):
+        budget = get_query_budget(view_name, request.method)
+        if budget is None or metrics.queries <= budget:
+            return
+        message = (
+            f'{request.method} {request.path} ({view_name}): '
+            f'{metrics.queries} SQL-запросов при бюджете {budget}'
+        )
+        if settings.QUERY_BUDGET_MODE == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
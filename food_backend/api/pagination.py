@@ -0,0 +1,162 @@
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination, LimitOffsetPagination, _reverse_ordering
+)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Курсор, позиция которого — значения всех полей ``ordering``.
+
+    В ``CursorPagination`` позиция — только первое поле, и строки с
+    одинаковым ``created_at`` (``bulk_create``, импорт) пропускались или
+    повторялись на соседних страницах. Последнее поле ``ordering`` должно
+    быть уникальным, поля сортируются в одном направлении.
+    """
+    position_separator = '|'
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [field.lstrip('-') for field in ordering]
+        if isinstance(instance, dict):
+            values = [instance[field] for field in fields]
+        else:
+            values = [getattr(instance, field) for field in fields]
+        return self.position_separator.join(str(value) for value in values)
+
+    def filter_position(self, queryset, position, reverse):
+        """Строки строго после ``position`` в порядке ``ordering``.
+
+        ``(a, b) > (x, y)`` раскрывается в ``a > x OR (a = x AND b > y)``:
+        так Django 3.2 использует индекс по этим полям.
+        """
+        fields = [field.lstrip('-') for field in self.ordering]
+        values = position.split(self.position_separator, len(fields) - 1)
+        if len(values) != len(fields):
+            raise NotFound(self.invalid_cursor_message)
+        # Курсор назад по возрастающему порядку — то же, что вперед по убывающему.
+        lookup = 'lt' if reverse != self.ordering[0].startswith('-') else 'gt'
+        conditions = [
+            Q(**dict(zip(fields[:index], values[:index])),
+              **{f'{fields[index]}__{lookup}': values[index]})
+            for index in range(len(fields))
+        ]
+        try:
+            return queryset.filter(reduce(or_, conditions))
+        except (ValidationError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Повторяет CursorPagination.paginate_queryset, кроме фильтра по позиции.
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = self.filter_position(queryset, current_position, reverse)
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class ProductCursorPagination(KeysetCursorPagination):
+    """Keyset-пагинация по (created_at, id) без OFFSET и COUNT(*)."""
+    ordering = ('created_at', 'id')
+    page_size = 24
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class OrderCursorPagination(KeysetCursorPagination):
+    """История заказов: новые сверху, без COUNT(*)."""
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class ReviewCursorPagination(KeysetCursorPagination):
+    """Отзывы о товаре: новые сверху, без COUNT(*)."""
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class CatalogPagination(LimitOffsetPagination):
+    """Limit/offset для каталога: без ``limit`` список отдается целиком.
+
+    Если в запросе есть параметр ``cursor`` (в том числе пустой — первая
+    страница), пагинация переключается на keyset-режим.
+    """
+    cursor_pagination_class = ProductCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_html_context()
+        return super().get_html_context()
+
+
+class CategoryPagination(CatalogPagination):
+    """Товары категории: большие категории всегда отдаются страницами."""
+    default_limit = 24
+    max_limit = 100
@@ -1,10 +1,38 @@
 from rest_framework import serializers
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from drf_extra_fields.fields import HybridImageField
 from food.models import (
     CustomUser, Category, Product, ProductImage, Cart, CartItem, Order, OrderItem, Review, PromoCode
 )
+import time
 from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from .uploads import ImageTooLarge, check_image_limits
+
+
+class TimedRepresentationMixin:
+    """Время ``to_representation`` идет в ``serialize`` метрик запроса.
+
+    Время SQL-запросов из сериализации сюда не входит. Вложенные
+    сериализаторы выполняются внутри внешнего и отдельно не считаются;
+    у ``many=True`` суммируется время по каждому объекту.
+    """
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        metrics = getattr(request, 'request_metrics', None)
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        started, db_time = time.perf_counter(), metrics.db_time
+        try:
+            return super().to_representation(instance)
+        finally:
+            # SQL ленивых querysets уже учтен в db.
+            elapsed = time.perf_counter() - started
+            metrics.serialize_time += elapsed - (metrics.db_time - db_time)
+            metrics.serializing = False
 
 
 class CustomUserSerializer(UserSerializer):
@@ -15,14 +43,38 @@ class CustomUserSerializer(UserSerializer):
         fields = UserSerializer.Meta.fields + ('address', "first_name", "last_name")
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ('id', 'name', 'slug')
 
 
-class ProductImageSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+class ImageVariantsField(serializers.Field):
+    """URL и размеры WebP-вариантов картинки."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, product_image):
+        storage = product_image.image.storage
+        request = self.context.get('request')
+        result = {}
+        for name, variant in product_image.variants.items():
+            url = storage.url(variant['name'])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            result[name] = {
+                'url': url, 'width': variant['width'], 'height': variant['height']
+            }
+        return result
+
+
+class ProductImageSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    """Картинка принимается файлом multipart/form-data или строкой base64."""
+    image = HybridImageField()
+    variants = ImageVariantsField()
     product = serializers.SlugRelatedField(
         slug_field='name', 
         queryset=Product.objects.all()
@@ -30,10 +82,31 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ProductImage
-        fields = ('id', 'image', 'product')
+        fields = ('id', 'image', 'variants', 'product')
+
+    def validate_image(self, image):
+        # Для base64 лимиты проверяются уже после декодирования,
+        # multipart-загрузки отсекаются раньше, в LimitedImageUploadHandler.
+        try:
+            check_image_limits(image.size, *image.image.size)
+        except ImageTooLarge as exc:
+            raise serializers.ValidationError(str(exc))
+        return image
+
 
+class ProductNestedImageSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    """Картинка внутри товара: родитель берется из prefetch, без запросов."""
+    image = serializers.ImageField(read_only=True)
+    variants = ImageVariantsField()
+    product = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = ProductImage
+        fields = ('id', 'image', 'variants', 'product')
+        read_only_fields = fields
 
-class ProductSerializer(serializers.ModelSerializer):
+
+class ProductSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     category = serializers.SlugRelatedField(
         slug_field='slug', 
         queryset=Category.objects.all(), 
@@ -43,7 +116,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
     category_detail = CategorySerializer(source='category', read_only=True)
     
-    images = ProductImageSerializer(many=True, read_only=True)
+    images = ProductNestedImageSerializer(many=True, read_only=True)
     
     average_rating = serializers.FloatField(read_only=True)
 
@@ -57,14 +130,14 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at',)
 
 
-class PromoCodeSerializer(serializers.ModelSerializer):
+class PromoCodeSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = PromoCode
         fields = ('code', 'discount_percent', 'expires_at')
         read_only_fields = fields
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     product = serializers.SlugRelatedField(
         slug_field='name', 
         queryset=Product.objects.all()
@@ -76,7 +149,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         fields = ('id', 'product', 'product_detail', 'quantity')
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     user = serializers.SlugRelatedField(slug_field='username', read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
     promo_code = PromoCodeSerializer(read_only=True)
@@ -92,23 +165,34 @@ class CartSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('created_at',)
 
+    def _get_totals(self, obj):
+        """Подытог, скидка и итог считаются один раз на корзину"""
+        if not hasattr(self, '_totals'):
+            self._totals = {}
+        if obj.pk not in self._totals:
+            subtotal = sum(
+                item.product.price * item.quantity
+                for item in obj.items.all()
+            )
+            discount = Decimal('0.00')
+            if obj.promo_code:
+                discount_percent = Decimal(obj.promo_code.discount_percent) / Decimal(100)
+                discount = (subtotal * discount_percent).quantize(Decimal('0.01'))
+            self._totals[obj.pk] = {
+                'subtotal': subtotal,
+                'discount_amount': discount,
+                'total': (subtotal - discount).quantize(Decimal('0.01')),
+            }
+        return self._totals[obj.pk]
+
     def get_subtotal(self, obj):
-        return sum(
-            item.product.price * item.quantity 
-            for item in obj.items.all()
-        )
+        return self._get_totals(obj)['subtotal']
 
     def get_discount_amount(self, obj):
-        subtotal = self.get_subtotal(obj)
-        if obj.promo_code:
-            discount_percent = Decimal(obj.promo_code.discount_percent) / Decimal(100)
-            return (subtotal * discount_percent).quantize(Decimal('0.01'))
-        return Decimal('0.00')
+        return self._get_totals(obj)['discount_amount']
 
     def get_total(self, obj):
-        subtotal = self.get_subtotal(obj)
-        discount = self.get_discount_amount(obj)
-        return (subtotal - discount).quantize(Decimal('0.01'))
+        return self._get_totals(obj)['total']
 
 
 class AddToCartSerializer(serializers.Serializer):
@@ -121,13 +205,19 @@ class AddToCartSerializer(serializers.Serializer):
         user = self.context['request'].user
         product = self.validated_data['product']
 
-        cart, _ = Cart.objects.get_or_create(user=user)
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
-
+        items = CartItem.objects.filter(cart__user=user, product=product)
+        if not items.update(quantity=F('quantity') + 1):
+            try:
+                with transaction.atomic():
+                    # Новые позиции создаются под блокировкой корзины, как в bulk.
+                    cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+                    return CartItem.objects.create(cart=cart, product=product)
+            except IntegrityError:
+                # Позицию только что создал параллельный запрос.
+                items.update(quantity=F('quantity') + 1)
+
+        cart_item = items.get()
+        cart_item.product = product
         return cart_item
 
 
@@ -142,16 +232,14 @@ class DecreaseCartItemSerializer(serializers.Serializer):
         user = self.context['request'].user
         product = self.validated_data['product']
 
+        items = CartItem.objects.filter(cart__user=user, product=product)
+        items.filter(quantity__gt=1).update(quantity=F('quantity') - 1)
         try:
-            cart = Cart.objects.get(user=user)
-            cart_item = CartItem.objects.get(cart=cart, product=product)
-        except (Cart.DoesNotExist, CartItem.DoesNotExist):
+            cart_item = items.get()
+        except CartItem.DoesNotExist:
             raise serializers.ValidationError("Продукт отсутствует в корзине")
 
-        if cart_item.quantity > 1:
-            cart_item.quantity -= 1
-            cart_item.save()
-
+        cart_item.product = product
         return cart_item
 
 
@@ -165,11 +253,10 @@ class RemoveCartItemSerializer(serializers.Serializer):
         user = self.context['request'].user
         product = self.validated_data['product']
 
-        try:
-            cart = Cart.objects.get(user=user)
-            cart_item = CartItem.objects.get(cart=cart, product=product)
-            cart_item.delete()
-        except (Cart.DoesNotExist, CartItem.DoesNotExist):
+        deleted, _ = CartItem.objects.filter(
+            cart__user=user, product=product
+        ).delete()
+        if not deleted:
             raise serializers.ValidationError("Продукт отсутствует в корзине")
 
         return { "removed": True }
@@ -178,14 +265,121 @@ class RemoveCartItemSerializer(serializers.Serializer):
 class ClearCartSerializer(serializers.Serializer):
     def save(self):
         user = self.context['request'].user
+        CartItem.objects.filter(cart__user=user).delete()
+        return { "cleared": True }
 
-        try:
-            cart = Cart.objects.get(user=user)
-            cart.items.all().delete()
-        except Cart.DoesNotExist:
-            pass
 
-        return { "cleared": True }
+class CartOperationSerializer(serializers.Serializer):
+    SET = 'set'
+    DELTA = 'delta'
+    MAX_QUANTITY = 999
+
+    product = serializers.SlugField()
+    quantity = serializers.IntegerField(min_value=-MAX_QUANTITY, max_value=MAX_QUANTITY)
+    mode = serializers.ChoiceField(choices=(SET, DELTA), default=DELTA)
+
+    def validate(self, attrs):
+        if attrs['mode'] == self.SET and attrs['quantity'] < 0:
+            raise serializers.ValidationError("Количество не может быть отрицательным")
+        return attrs
+
+
+class BulkCartUpdateSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        slugs = {operation['product'] for operation in operations}
+        products = Product.objects.in_bulk(slugs, field_name='slug')
+        missing = sorted(slugs - products.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f"Продукты не найдены: {', '.join(missing)}"
+            )
+        for operation in operations:
+            operation['product'] = products[operation['product']]
+        return operations
+
+    @transaction.atomic
+    def save(self):
+        user = self.context['request'].user
+        operations = self.validated_data['operations']
+
+        # Блокировка корзины не дает add создать позицию параллельно,
+        # блокировка позиций — потерять его F()-увеличение количества.
+        cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+        items = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(
+                cart=cart,
+                product__in=[operation['product'] for operation in operations]
+            )
+        }
+        quantities = {
+            product_id: item.quantity for product_id, item in items.items()
+        }
+        # Товары, для которых итог не зависит от прежнего количества.
+        absolute = set()
+        for operation in operations:
+            product_id = operation['product'].pk
+            if operation['mode'] == CartOperationSerializer.SET:
+                quantities[product_id] = operation['quantity']
+                absolute.add(product_id)
+            else:
+                quantities[product_id] = (
+                    quantities.get(product_id, 0) + operation['quantity']
+                )
+
+        to_create, to_update, to_delete = [], [], []
+        for product_id, quantity in quantities.items():
+            item = items.get(product_id)
+            if quantity > CartOperationSerializer.MAX_QUANTITY:
+                raise serializers.ValidationError(
+                    f"Не больше {CartOperationSerializer.MAX_QUANTITY} штук одного товара"
+                )
+            if quantity <= 0:
+                if item:
+                    to_delete.append(item.pk)
+            elif item is None:
+                to_create.append(
+                    CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                )
+            elif item.quantity != quantity:
+                item.quantity = quantity
+                to_update.append(item)
+
+        if to_create:
+            self.create_items(cart, to_create, absolute)
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+        CartItem.objects.filter(pk__in=to_delete).delete()
+
+        subtotal = cart.items.aggregate(
+            subtotal=Sum(F('product__price') * F('quantity'))
+        )['subtotal']
+        if subtotal is None:
+            cart.clear_promo_code()
+        elif cart.promo_code_id:
+            cart.discount_amount = subtotal * cart.promo_code.discount_percent / 100
+            cart.save(update_fields=['discount_amount'])
+        return cart
+
+    @staticmethod
+    def create_items(cart, to_create, absolute):
+        CartItem.objects.bulk_create(to_create, ignore_conflicts=True)
+        # Позицию мог вставить кто-то, кто не блокирует корзину: тогда
+        # изменения применяются к ее количеству, а не к нулю.
+        wanted = {item.product_id: item.quantity for item in to_create}
+        conflicts = [
+            item for item in CartItem.objects.select_for_update().filter(
+                cart=cart, product__in=wanted
+            )
+            if item.quantity != wanted[item.product_id]
+        ]
+        for item in conflicts:
+            if item.product_id in absolute:
+                item.quantity = wanted[item.product_id]
+            else:
+                item.quantity += wanted[item.product_id]
+        CartItem.objects.bulk_update(conflicts, ['quantity'])
 
 
 class ApplyPromoCodeSerializer(serializers.Serializer):
@@ -205,20 +399,16 @@ class RemovePromoCodeSerializer(serializers.Serializer):
     pass
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    product = serializers.SlugRelatedField(
-        slug_field='name',
-        queryset=Product.objects.all(),
-        allow_null=True,
-        required=False
-    )
+class OrderItemSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    product = serializers.CharField(source='product_name', read_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ('id', 'product', 'quantity', 'price_per_item')
+        fields = ('id', 'product', 'product_slug', 'quantity', 'price_per_item')
+        read_only_fields = fields
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     user = serializers.SlugRelatedField(slug_field='username', read_only=True)
     items = OrderItemSerializer(many=True, read_only=True)
     promo_code = PromoCodeSerializer(read_only=True)
@@ -233,7 +423,7 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at',)
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     user = serializers.SlugRelatedField(
         slug_field='username', read_only=True
     )
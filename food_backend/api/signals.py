@@ -0,0 +1,81 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from food.models import Category, Product, ProductImage, PromoCode, Review
+from .cache import invalidate
+from .metrics import PROMO_CODES_ISSUED
+
+
+def _category_slugs(**filters):
+    return list(Category.objects.filter(**filters).values_list('slug', flat=True))
+
+
+def _product_scopes(product_id, category_slugs):
+    return ['products', f'product:{product_id}'] + [
+        f'category-products:{slug}' for slug in category_slugs
+    ]
+
+
+def invalidate_products(product_ids):
+    """Инвалидирует товары, измененные в обход сигналов (``bulk_update``)."""
+    rows = Product.objects.filter(pk__in=product_ids).values_list('pk', 'category__slug')
+    invalidate(*[
+        scope for product_id, slug in rows
+        for scope in _product_scopes(product_id, [slug] if slug else [])
+    ])
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_slug(sender, instance, update_fields=None, **kwargs):
+    instance._previous_slugs = []
+    if instance.pk and (update_fields is None or 'slug' in update_fields):
+        instance._previous_slugs = _category_slugs(pk=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    slugs = [instance.slug] + getattr(instance, '_previous_slugs', [])
+    invalidate(
+        'categories', f'category:{instance.pk}',
+        *[f'category-products:{slug}' for slug in slugs]
+    )
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, update_fields=None, **kwargs):
+    instance._previous_category_slugs = []
+    if instance.pk and (update_fields is None or 'category' in update_fields):
+        instance._previous_category_slugs = _category_slugs(products__pk=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    slugs = getattr(instance, '_previous_category_slugs', [])
+    if instance.category_id:
+        slugs = slugs + _category_slugs(pk=instance.category_id)
+    invalidate(*_product_scopes(instance.pk, slugs))
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_image_cache(sender, instance, **kwargs):
+    invalidate(
+        'images', f'image:{instance.pk}',
+        *_product_scopes(
+            instance.product_id, _category_slugs(products__pk=instance.product_id)
+        )
+    )
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review_product_cache(sender, instance, **kwargs):
+    invalidate(*_product_scopes(
+        instance.product_id, _category_slugs(products__pk=instance.product_id)
+    ))
+
+
+@receiver(post_save, sender=PromoCode)
+def count_issued_promo(sender, instance, created, **kwargs):
+    # Кампании выпускаются через bulk_create и сюда не попадают.
+    if created and instance.user_id:
+        kind = 'zero' if instance.discount_percent == 0 else 'discount'
+        PROMO_CODES_ISSUED.labels(kind=kind).inc()
@@ -1,3 +1,1285 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (
+    LiveServerTestCase, RequestFactory, SimpleTestCase, TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient, APITestCase
+
+from food.models import (
+    Cart, CartItem, Category, CustomUser, Order, OrderItem, Product, ProductImage,
+    PromoCode, Review
+)
+from food.search import prefix_query
+from food_backend.db.pool import ConnectionPool, PoolTimeout
+from .benchmarks import compare
+from .benchmarks.pagination import encode_cursor
+from .benchmarks.seed import seed_dataset
+from .cache import get_cache
+from .serializers import BulkCartUpdateSerializer
+from .middleware import QueryBudgetExceeded, get_stats_cache, loggable_body
+
+
+def create_products(category, count, images_per_product=2):
+    Product.objects.bulk_create(
+        Product(
+            name=f'Товар {category.slug} {i}',
+            slug=f'{category.slug}-product-{i}',
+            price=Decimal('100.00') + i,
+            category=category,
+        )
+        for i in range(count)
+    )
+    products = list(Product.objects.filter(category=category))
+    ProductImage.objects.bulk_create(
+        ProductImage(product=product, image=f'product_images/{product.slug}-{j}.jpg')
+        for product in products
+        for j in range(images_per_product)
+    )
+    return products
+
+
+def use_temporary_media(test):
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    settings_override = override_settings(MEDIA_ROOT=media_root)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+def jpeg_upload(name='extra.jpg'):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+class ProductQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Фрукты', slug='fruits')
+        create_products(cls.category, 30)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        small, _ = self.count_queries('/v1/products/?limit=5')
+        large, response = self.count_queries('/v1/products/?limit=30')
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data['results']), 30)
+
+    def test_by_category_query_count_does_not_grow(self):
+        create_products(Category.objects.create(name='Овощи', slug='vegetables'), 3)
+        small, _ = self.count_queries('/v1/products/category/vegetables/')
+        large, _ = self.count_queries('/v1/products/category/fruits/')
+        self.assertEqual(small, large)
+
+    def test_nested_images_keep_product_name(self):
+        product = Product.objects.first()
+        _, response = self.count_queries(f'/v1/products/{product.id}/')
+        self.assertEqual(len(response.data['images']), 2)
+        self.assertEqual(response.data['images'][0]['product'], product.name)
+        self.assertEqual(response.data['category_detail']['slug'], 'fruits')
+
+
+class CategoryProductsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Фрукты', slug='fruits')
+        cls.products = create_products(cls.category, 30, images_per_product=1)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def test_paginated_and_filtered(self):
+        Product.objects.filter(pk=self.products[0].pk).update(is_available=False)
+        response = self.client.get(
+            '/v1/products/category/fruits/?limit=10&is_available=true'
+        )
+        self.assertEqual(response.data['count'], 29)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_default_limit(self):
+        response = self.client.get('/v1/products/category/fruits/')
+        self.assertEqual(len(response.data['results']), 24)
+
+    def test_repeated_request_served_from_cache(self):
+        self.client.get('/v1/products/category/fruits/?limit=5')
+        with self.assertNumQueries(1):
+            response = self.client.get('/v1/products/category/fruits/?limit=5')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_product_change_invalidates_category(self):
+        url = '/v1/products/category/fruits/?limit=1'
+        self.client.get(url)
+        product = self.products[0]
+        product.name = 'Новое имя'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['name'], 'Новое имя')
+
+    def test_image_change_invalidates_category(self):
+        url = '/v1/products/category/fruits/?limit=1'
+        self.client.get(url)
+        use_temporary_media(self)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=self.products[0], image=jpeg_upload())
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results'][0]['images']), 2)
+
+    def test_moving_product_invalidates_old_category(self):
+        url = '/v1/products/category/fruits/'
+        self.client.get(url)
+        product = self.products[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            product.category = Category.objects.create(name='Овощи', slug='vegetables')
+            product.save()
+        self.assertEqual(self.client.get(url).data['count'], 29)
+        self.assertEqual(
+            self.client.get('/v1/products/category/vegetables/').data['count'], 1
+        )
+
+
+class ProductCursorPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_products(Category.objects.create(name='Фрукты', slug='fruits'), 25)
+
+    def test_cursor_mode_walks_whole_catalog(self):
+        response = self.client.get('/v1/products/?cursor=&limit=10')
+        self.assertNotIn('count', response.data)
+        seen = []
+        while True:
+            seen += [product['id'] for product in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        expected = list(
+            Product.objects.order_by('created_at', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_cursor_keeps_rows_with_identical_timestamps(self):
+        Product.objects.update(created_at=timezone.now())
+        expected = list(Product.objects.order_by('id').values_list('id', flat=True))
+        pages = []
+        response = self.client.get('/v1/products/?cursor=&limit=10')
+        while True:
+            pages.append([product['id'] for product in response.data['results']])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sum(pages, []), expected)
+
+        # Назад от последней страницы — те же страницы в обратном порядке.
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            self.assertEqual(
+                [product['id'] for product in response.data['results']],
+                pages[-2]
+            )
+            pages.pop()
+
+    def test_malformed_cursor_position_is_404(self):
+        cursor = encode_cursor('not-a-date|1')
+        response = self.client.get(f'/v1/products/?limit=10&cursor={cursor}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_limit_offset_contract_unchanged(self):
+        response = self.client.get('/v1/products/?limit=10&offset=20')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_list_without_limit_is_not_paginated(self):
+        response = self.client.get('/v1/products/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 25)
+        # Лимит по умолчанию есть только у товаров категории.
+        response = self.client.get('/v1/products/category/fruits/')
+        self.assertEqual(len(response.data['results']), 24)
+
+
+class ProductSearchTests(APITestCase):
+    # На PostgreSQL "ябл:*" находит и описание груши: см. PostgresSearchTests.
+    @skipUnless(connection.vendor == 'sqlite', 'Поиск по названию без PostgreSQL')
+    def test_search_falls_back_to_name_lookup(self):
+        category = Category.objects.create(name='Фрукты', slug='fruits')
+        Product.objects.create(
+            name='Яблоко', slug='apple', price=Decimal('10.00'), category=category
+        )
+        Product.objects.create(
+            name='Груша', slug='pear', price=Decimal('12.00'), category=category,
+            description='Сочная, как яблоко'
+        )
+        response = self.client.get('/v1/products/', {'search': 'Ябл', 'limit': 10})
+        self.assertEqual(
+            [product['slug'] for product in response.data['results']], ['apple']
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Полнотекстовый поиск есть только в PostgreSQL')
+class PostgresSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Фрукты', slug='fruits')
+        Product.objects.create(
+            name='Яблоко', slug='apple', price=Decimal('10.00'), category=category
+        )
+        Product.objects.create(
+            name='Груша', slug='pear', price=Decimal('12.00'), category=category,
+            description='Сочная, как яблоко'
+        )
+        Product.objects.create(
+            name='Молоко', slug='milk', price=Decimal('8.00'), category=category
+        )
+
+    def search(self, text):
+        response = self.client.get('/v1/products/', {'search': text, 'limit': 10})
+        return [product['slug'] for product in response.data['results']]
+
+    def matches_vector(self, text):
+        query = SearchQuery(text, config=settings.PRODUCT_SEARCH_CONFIG)
+        return list(
+            Product.objects.filter(search_vector=query)
+            .order_by('slug').values_list('slug', flat=True)
+        )
+
+    def test_prefix_matches_name_before_description(self):
+        self.assertEqual(self.search('ябл'), ['apple', 'pear'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('сочн ябл'), ['pear'])
+
+    def test_typo_in_name_is_found_by_trigrams(self):
+        self.assertIn('apple', self.search('Яблако'))
+
+    def test_trigger_updates_vector_after_bulk_writes(self):
+        Product.objects.bulk_create([
+            Product(name='Кефир', slug='kefir', price=Decimal('5.00'))
+        ])
+        self.assertEqual(self.matches_vector('кефир'), ['kefir'])
+
+        Product.objects.filter(slug='kefir').update(description='Свежий творог')
+        self.assertEqual(self.matches_vector('творог'), ['kefir'])
+        Product.objects.filter(slug='kefir').update(name='Ряженка')
+        self.assertEqual(self.matches_vector('кефир'), [])
+        self.assertEqual(self.matches_vector('ряженка'), ['kefir'])
+
+
+class PrefixQueryTests(SimpleTestCase):
+    def test_every_word_is_a_prefix(self):
+        self.assertEqual(prefix_query('Ябл  мол'), 'ябл:* & мол:*')
+
+    def test_tsquery_operators_are_dropped(self):
+        self.assertEqual(prefix_query("сыр & !(кофе:*) '"), 'сыр:* & кофе:*')
+        self.assertEqual(prefix_query('&|!'), '')
+
+
+class CatalogCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Фрукты', slug='fruits')
+        cls.products = create_products(cls.category, 3, images_per_product=1)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def assertCached(self, url, queries=1):
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        # Для каталога остается только чтение версий областей для ETag.
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        return response
+
+    def test_catalog_reads_are_cached(self):
+        product = self.products[0]
+        for url in (
+            '/v1/categories/',
+            f'/v1/categories/{self.category.pk}/',
+            '/v1/products/?limit=2',
+            f'/v1/products/{product.pk}/',
+            '/v1/images/',
+            f'/v1/images/{product.images.first().pk}/',
+        ):
+            self.assertCached(url)
+
+    def test_query_params_are_part_of_key(self):
+        self.assertCached('/v1/products/?limit=1')
+        response = self.client.get('/v1/products/?limit=2')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_product_write_invalidates_only_that_product(self):
+        first, second = self.products[:2]
+        self.assertCached(f'/v1/products/{first.pk}/')
+        self.assertCached(f'/v1/products/{second.pk}/')
+        first.price = Decimal('1.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        response = self.client.get(f'/v1/products/{first.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['price'], '1.00')
+        self.assertEqual(
+            self.client.get(f'/v1/products/{second.pk}/')['X-Cache'], 'HIT'
+        )
+
+    def test_invalidation_waits_for_commit(self):
+        product = self.products[0]
+        url = f'/v1/products/{product.pk}/'
+        self.assertCached(url)
+        product.price = Decimal('1.00')
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.save()
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_category_write_invalidates_nested_category(self):
+        self.assertCached('/v1/products/?limit=1')
+        self.category.name = 'Ягоды'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        response = self.client.get('/v1/products/?limit=1')
+        self.assertEqual(response.data['results'][0]['category_detail']['name'], 'Ягоды')
+
+    def test_review_write_invalidates_product(self):
+        product = self.products[0]
+        url = f'/v1/products/{product.pk}/'
+        self.assertCached(url)
+        user = CustomUser.objects.create_user(username='reviewer', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=user, product=product, rating=4)
+        self.assertEqual(self.client.get(url).data['average_rating'], 4.0)
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.assertCached('/v1/categories/')
+        self.assertEqual(self.client.get('/v1/cache-stats/').status_code, 401)
+        admin = CustomUser.objects.create_superuser(username='admin', password='pass')
+        self.client.force_authenticate(admin)
+        response = self.client.get('/v1/cache-stats/')
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+
+
+class RecomputeRatingsTests(APITestCase):
+    def test_repairs_drift_and_invalidates_products(self):
+        get_cache().clear()
+        category = Category.objects.create(name='Фрукты', slug='fruits')
+        product, other = create_products(category, 2, images_per_product=0)
+        users = [
+            CustomUser.objects.create_user(username=f'user{i}', password='pass')
+            for i in range(2)
+        ]
+        Review.objects.create(user=users[0], product=product, rating=4)
+        Review.objects.create(user=users[1], product=product, rating=5)
+        Product.objects.filter(pk=product.pk).update(rating_sum=100, rating_count=1)
+        Product.objects.filter(pk=other.pk).update(rating_sum=3, rating_count=1)
+        url = f'/v1/products/{product.pk}/'
+        self.assertEqual(self.client.get(url).data['average_rating'], 100.0)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('recompute_ratings', batch_size=1, stdout=out)
+        self.assertIn('2', out.getvalue())
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((product.rating_sum, product.rating_count), (9, 2))
+        self.assertEqual((other.rating_sum, other.rating_count), (0, 0))
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['average_rating'], 4.5)
+
+
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.category = Category.objects.create(name='Фрукты', slug='fruits')
+        cls.products = create_products(cls.category, 3, images_per_product=1)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def test_if_none_match_returns_304_without_serialization(self):
+        for url in (
+            '/v1/products/?limit=2',
+            f'/v1/products/{self.products[0].pk}/',
+            '/v1/products/category/fruits/',
+            '/v1/categories/',
+            f'/v1/categories/{self.category.pk}/',
+        ):
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_returns_304(self):
+        url = '/v1/products/?limit=2'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        url = f'/v1/products/{self.products[0].pk}/'
+        etag = self.client.get(url)['ETag']
+        other_url = f'/v1/products/{self.products[1].pk}/'
+        other_etag = self.client.get(other_url)['ETag']
+        use_temporary_media(self)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.create(product=self.products[0], image=jpeg_upload())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['images']), 2)
+        response = self.client.get(other_url, HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_touches_updated_at(self):
+        product = self.products[0]
+        before = Product.objects.get(pk=product.pk).updated_at
+        product.price = Decimal('5.00')
+        product.save()
+        self.assertGreater(Product.objects.get(pk=product.pk).updated_at, before)
+
+
+class CartReadTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='buyer', password='pass')
+        cls.products = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 10
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, count):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        cart.items.all().delete()
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=2)
+            for product in self.products[:count]
+        )
+        return cart
+
+    def count_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data)
+        self.assertEqual(response.status_code, 200, response.data)
+        return len(ctx.captured_queries), response
+
+    def test_cart_list_query_count_is_fixed(self):
+        self.fill_cart(1)
+        small, _ = self.count_queries('get', '/v1/cart/')
+        self.fill_cart(10)
+        large, response = self.count_queries('get', '/v1/cart/')
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data['items']), 10)
+
+    def test_totals(self):
+        cart = self.fill_cart(2)
+        cart.promo_code = PromoCode.objects.create(
+            user=self.user, code='SALE10', discount_percent=10,
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        cart.save()
+        response = self.client.get('/v1/cart/')
+        # (100 + 101) * 2 = 402, скидка 10%.
+        self.assertEqual(response.data['subtotal'], Decimal('402.00'))
+        self.assertEqual(response.data['discount_amount'], Decimal('40.20'))
+        self.assertEqual(response.data['total'], Decimal('361.80'))
+
+    def test_promo_actions_query_count_is_fixed(self):
+        counts = []
+        for size in (1, 10):
+            self.fill_cart(size)
+            PromoCode.objects.all().delete()
+            PromoCode.objects.create(
+                user=self.user, code='SALE10', discount_percent=10,
+                expires_at=timezone.now() + timedelta(days=1)
+            )
+            apply_count, response = self.count_queries(
+                'post', '/v1/cart/apply-promo/', {'code': 'SALE10'}
+            )
+            self.assertEqual(response.data['promo_code']['code'], 'SALE10')
+            remove_count, _ = self.count_queries('post', '/v1/cart/remove-promo/')
+            counts.append((apply_count, remove_count))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CartMutationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='buyer', password='pass')
+        cls.product = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 1
+        )[0]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def post(self, action):
+        return self.client.post(f'/v1/cart/{action}/', {'product': self.product.slug})
+
+    def test_add_and_decrease_payload(self):
+        first = self.post('add').data
+        self.assertEqual(first['product'], self.product.name)
+        self.assertEqual(first['quantity'], 1)
+        self.assertEqual(self.post('add').data, {**first, 'quantity': 2})
+        self.assertEqual(self.post('decrease').data['quantity'], 1)
+        self.assertEqual(self.post('decrease').data['quantity'], 1)
+
+    def test_increment_is_a_single_update(self):
+        self.post('add')
+        with self.assertNumQueries(3):
+            # Товар по slug, UPDATE ... quantity + 1 и чтение позиции.
+            self.assertEqual(self.post('add').data['quantity'], 2)
+
+    def test_missing_item(self):
+        self.assertEqual(self.post('decrease').status_code, 400)
+        self.assertEqual(self.post('remove').status_code, 400)
+
+    def test_removing_last_item_clears_promo(self):
+        self.post('add')
+        cart = Cart.objects.get(user=self.user)
+        cart.promo_code = PromoCode.objects.create(
+            user=self.user, code='SALE10', discount_percent=10,
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        cart.discount_amount = Decimal('10.00')
+        cart.save()
+        self.assertEqual(self.post('remove').data, {'removed': True})
+        cart.refresh_from_db()
+        self.assertIsNone(cart.promo_code)
+        self.assertEqual(cart.discount_amount, 0)
+
+
+
+class CartBulkTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='buyer', password='pass')
+        cls.products = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 10
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, *operations):
+        return self.client.post(
+            '/v1/cart/bulk/', {'operations': list(operations)}, format='json'
+        )
+
+    def quantities(self):
+        return dict(CartItem.objects.values_list('product__slug', 'quantity'))
+
+    def test_set_delta_and_delete(self):
+        first, second, third = (product.slug for product in self.products[:3])
+        self.bulk(
+            {'product': first, 'quantity': 3, 'mode': 'set'},
+            {'product': second, 'quantity': 2},
+        )
+        response = self.bulk(
+            {'product': first, 'quantity': 1},
+            {'product': second, 'quantity': -2},
+            {'product': third, 'quantity': 5, 'mode': 'set'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {first: 4, third: 5})
+        self.assertEqual(len(response.data['items']), 2)
+
+    def test_quantity_bounds(self):
+        slug = self.products[0].slug
+        self.assertEqual(self.bulk({'product': slug, 'quantity': 10 ** 12}).status_code, 400)
+        self.bulk({'product': slug, 'quantity': 999, 'mode': 'set'})
+        self.assertEqual(self.bulk({'product': slug, 'quantity': 1}).status_code, 400)
+        self.assertEqual(self.quantities(), {slug: 999})
+
+    def test_concurrent_insert_is_not_overwritten(self):
+        first, second = self.products[:2]
+        cart = Cart.objects.create(user=self.user)
+        create_items = BulkCartUpdateSerializer.create_items
+
+        def add_first(*args):
+            # Позиция появилась между чтением корзины и вставкой.
+            CartItem.objects.create(cart=cart, product=first, quantity=2)
+            CartItem.objects.create(cart=cart, product=second, quantity=2)
+            create_items(*args)
+
+        with mock.patch.object(
+            BulkCartUpdateSerializer, 'create_items', side_effect=add_first
+        ):
+            response = self.bulk(
+                {'product': first.slug, 'quantity': 3},
+                {'product': second.slug, 'quantity': 5, 'mode': 'set'},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {first.slug: 5, second.slug: 5})
+
+    def test_unknown_product_rejected(self):
+        response = self.bulk({'product': 'missing', 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+    def test_discount_recomputed_and_cleared(self):
+        cart = Cart.objects.create(
+            user=self.user,
+            promo_code=PromoCode.objects.create(
+                user=self.user, code='SALE10', discount_percent=10,
+                expires_at=timezone.now() + timedelta(days=1)
+            )
+        )
+        slug = self.products[0].slug
+        self.bulk({'product': slug, 'quantity': 2})
+        cart.refresh_from_db()
+        self.assertEqual(cart.discount_amount, Decimal('20.00'))
+        self.bulk({'product': slug, 'quantity': 0, 'mode': 'set'})
+        cart.refresh_from_db()
+        self.assertIsNone(cart.promo_code)
+
+    def test_query_count_does_not_grow_with_operations(self):
+        Cart.objects.create(user=self.user)
+        counts = []
+        for products in (self.products[:2], self.products[2:]):
+            operations = [
+                {'product': product.slug, 'quantity': 1} for product in products
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                self.bulk(*operations)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CheckoutTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='buyer', password='pass', address='Казань',
+            first_name='Иван', last_name='Иванов'
+        )
+        cls.products = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 20
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, count, promo=None):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=2)
+            for product in self.products[:count]
+        )
+        if promo:
+            cart.apply_promo_code(promo)
+        return cart
+
+    def checkout(self):
+        return self.client.post('/v1/orders/create-from-cart/')
+
+    def test_checkout_with_promo(self):
+        promo = PromoCode.objects.create(
+            user=self.user, code='SALE10', discount_percent=10,
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        self.fill_cart(2, promo)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        # (100 + 101) * 2 = 402, скидка 10%.
+        self.assertEqual(Decimal(response.data['total_price']), Decimal('361.80'))
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(response.data['promo_code']['code'], 'SALE10')
+        promo.refresh_from_db()
+        self.assertTrue(promo.is_used)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.checkout().status_code, 400)
+
+    def test_campaign_code_is_redeemed_once(self):
+        promo = PromoCode.objects.create(
+            code='SPRING01', discount_percent=10, campaign='spring',
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        other = CustomUser.objects.create_user(
+            username='other', password='pass', address='Казань',
+            first_name='Петр', last_name='Петров'
+        )
+        other_cart = Cart.objects.create(user=other)
+        CartItem.objects.create(cart=other_cart, product=self.products[0], quantity=1)
+        # Оба применили код до того, как кто-то из них оформил заказ.
+        other_cart.apply_promo_code(promo)
+        self.fill_cart(1, promo)
+
+        self.assertEqual(self.checkout().status_code, 201)
+        self.client.force_authenticate(other)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.filter(user=other).count(), 0)
+        other_cart.refresh_from_db()
+        self.assertIsNone(other_cart.promo_code)
+        self.assertEqual(other_cart.discount_amount, 0)
+
+    def test_unavailable_product_blocks_checkout(self):
+        self.fill_cart(2)
+        Product.objects.filter(pk=self.products[1].pk).update(is_available=False)
+        self.assertEqual(self.checkout().status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        counts = []
+        for size in (1, 20):
+            self.fill_cart(size)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.checkout().status_code, 201)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class MetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='buyer', password='pass', address='Казань',
+            first_name='Иван', last_name='Иванов'
+        )
+        cls.products = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 2
+        )
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_metrics_endpoint(self):
+        get_cache().clear()
+        labels = {'view': 'category-list', 'method': 'GET', 'status': '200'}
+        requests = self.sample('api_request_duration_seconds_count', **labels)
+        hits = self.sample('api_catalog_cache_requests_total', result='hit')
+        self.client.get('/v1/categories/')
+        self.client.get('/v1/categories/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'api_requests_in_progress', response.content)
+        self.assertEqual(
+            self.sample('api_request_duration_seconds_count', **labels), requests + 2
+        )
+        self.assertEqual(
+            self.sample('api_catalog_cache_requests_total', result='hit'), hits + 1
+        )
+
+    def test_checkout_counters(self):
+        created = self.sample('api_checkouts_total', result='created')
+        revenue = self.sample('api_checkout_revenue_rubles_total')
+        empty = self.sample('api_checkouts_total', result='empty_cart')
+        self.client.force_authenticate(self.user)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/v1/orders/create-from-cart/').status_code, 201)
+        self.client.post('/v1/orders/create-from-cart/')
+        self.assertEqual(self.sample('api_checkouts_total', result='created'), created + 1)
+        self.assertEqual(self.sample('api_checkout_revenue_rubles_total'), revenue + 200)
+        self.assertEqual(self.sample('api_checkouts_total', result='empty_cart'), empty + 1)
+
+
+class OrderHistoryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='buyer', password='pass')
+        cls.products = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 5
+        )
+        promo = PromoCode.objects.create(
+            user=cls.user, code='SALE10', discount_percent=10,
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        for i in range(25):
+            order = Order.objects.create(
+                user=cls.user, delivery_address='Казань', total_price=Decimal('1.00'),
+                promo_code=promo if i % 2 else None
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order, product=product, product_name=product.name,
+                    product_slug=product.slug, quantity=1, price_per_item=product.price
+                )
+                for product in cls.products
+            )
+        Order.objects.create(
+            user=CustomUser.objects.create_user(username='other', password='pass'),
+            delivery_address='Москва', total_price=Decimal('1.00')
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_history_is_cursor_paginated_newest_first(self):
+        response = self.client.get('/v1/orders/?limit=10')
+        self.assertNotIn('count', response.data)
+        seen = []
+        while True:
+            seen += [order['id'] for order in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        expected = list(
+            Order.objects.filter(user=self.user)
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_query_count_is_constant_per_page(self):
+        counts = []
+        for limit in (2, 20):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(f'/v1/orders/?limit={limit}')
+            self.assertEqual(len(response.data['results']), limit)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        order = response.data['results'][0]
+        self.assertEqual(order['user'], 'buyer')
+        self.assertEqual(len(order['items']), 5)
+
+    def test_history_survives_product_changes(self):
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(name='Переименован')
+        self.products[1].delete()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/v1/orders/?limit=1')
+        self.assertFalse(
+            any('food_product' in query['sql'] for query in ctx.captured_queries)
+        )
+        items = response.data['results'][0]['items']
+        self.assertEqual(
+            [item['product'] for item in items[:2]],
+            [product.name, self.products[1].name]
+        )
+        self.assertEqual(items[0]['product_slug'], product.slug)
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite блокирует всю базу на запись')
+class CartConcurrencyTests(TransactionTestCase):
+    workers = 8
+    requests_per_worker = 10
+
+    def setUp(self):
+        self.users = [
+            CustomUser.objects.create_user(username=f'buyer{i}', password='pass')
+            for i in range(2)
+        ]
+        self.product = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 1
+        )[0]
+
+    def hammer(self, action):
+        def worker(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                for _ in range(self.requests_per_worker):
+                    response = client.post(
+                        f'/v1/cart/{action}/', {'product': self.product.slug}
+                    )
+                    self.assertEqual(response.status_code, 200, response.data)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = [
+                pool.submit(worker, self.users[i % len(self.users)])
+                for i in range(self.workers)
+            ]
+            for future in futures:
+                future.result()
+
+    def quantities(self):
+        return dict(
+            CartItem.objects.values_list('cart__user__username', 'quantity')
+        )
+
+    def test_parallel_add_and_decrease(self):
+        per_user = self.workers // len(self.users) * self.requests_per_worker
+        self.hammer('add')
+        self.assertEqual(self.quantities(), {'buyer0': per_user, 'buyer1': per_user})
+        CartItem.objects.update(quantity=per_user + 5)
+        self.hammer('decrease')
+        self.assertEqual(self.quantities(), {'buyer0': 5, 'buyer1': 5})
+
+
+class ReviewListTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 1
+        )[0]
+        for i in range(25):
+            user = CustomUser.objects.create_user(username=f'user{i}', password='pass')
+            Review.objects.create(
+                user=user, product=cls.product, rating=i % 3 + 3, text=f'Отзыв {i}'
+            )
+
+    def test_reviews_are_cursor_paginated_with_distribution(self):
+        url = f'/v1/products/{self.product.pk}/reviews/'
+        response = self.client.get(url)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(
+            response.data['rating_distribution'],
+            {'1': 0, '2': 0, '3': 9, '4': 8, '5': 8}
+        )
+        seen = []
+        while True:
+            seen += [review['id'] for review in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        expected = list(
+            Review.objects.filter(product=self.product)
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_query_count_is_constant_per_page(self):
+        url = f'/v1/products/{self.product.pk}/reviews/'
+        counts = []
+        for limit in (2, 20):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(f'{url}?limit={limit}')
+            self.assertEqual(len(response.data['results']), limit)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts, [3, 3])
+        self.assertEqual(response.data['results'][0]['user'], 'user24')
+
+    def test_missing_product_returns_404(self):
+        self.assertEqual(self.client.get('/v1/products/0/reviews/').status_code, 404)
+        self.client.force_authenticate(CustomUser.objects.get(username='user0'))
+        response = self.client.post(
+            '/v1/products/0/reviews/', {'rating': 5, 'text': 'Нет товара'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_create_review_for_product(self):
+        user = CustomUser.objects.create_user(username='newcomer', password='pass')
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            f'/v1/products/{self.product.pk}/reviews/', {'rating': 1, 'text': 'Плохо'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user'], 'newcomer')
+        self.assertTrue(Review.objects.filter(user=user, product=self.product).exists())
+
+
+@override_settings(
+    IMAGE_VARIANTS_ASYNC=False,
+    IMAGE_UPLOAD_MAX_SIZE=200 * 1024,
+    IMAGE_UPLOAD_MAX_DIMENSION=1000,
+)
+class ProductImageUploadTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_products(
+            Category.objects.create(name='Фрукты', slug='fruits'), 1,
+            images_per_product=0
+        )[0]
+        cls.admin = CustomUser.objects.create_superuser(username='admin', password='pass')
+
+    def setUp(self):
+        use_temporary_media(self)
+        self.client.force_authenticate(self.admin)
+
+    def image_bytes(self, size=(800, 600), image_format='PNG'):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'green').save(buffer, image_format)
+        return buffer.getvalue()
+
+    def test_multipart_upload(self):
+        upload = SimpleUploadedFile('apple.png', self.image_bytes(), 'image/png')
+        response = self.client.post(
+            '/v1/images/', {'product': self.product.name, 'image': upload},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        image = ProductImage.objects.get(pk=response.data['id'])
+        self.assertEqual((image.image.width, image.image.height), (800, 600))
+
+    def test_base64_upload_is_still_supported(self):
+        encoded = base64.b64encode(self.image_bytes()).decode('ascii')
+        response = self.client.post(
+            '/v1/images/',
+            {'product': self.product.name, 'image': f'data:image/png;base64,{encoded}'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(ProductImage.objects.filter(pk=response.data['id']).exists())
+
+    def test_multipart_limits_are_checked_while_streaming(self):
+        # Слишком широкая картинка отклоняется по заголовку, без декодирования.
+        too_wide = self.image_bytes(size=(1001, 10))
+        noisy = Image.frombytes('RGB', (300, 300), os.urandom(300 * 300 * 3))
+        buffer = BytesIO()
+        noisy.save(buffer, 'BMP')
+        for content, error in ((too_wide, '1000 px'), (buffer.getvalue(), '200 КБ')):
+            upload = SimpleUploadedFile('big.png', content, 'image/png')
+            response = self.client.post(
+                '/v1/images/', {'product': self.product.name, 'image': upload},
+                format='multipart'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(error, response.data['detail'])
+        self.assertFalse(ProductImage.objects.exists())
+
+    def test_base64_limits(self):
+        encoded = base64.b64encode(self.image_bytes(size=(1200, 10))).decode('ascii')
+        response = self.client.post(
+            '/v1/images/', {'product': self.product.name, 'image': encoded},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+
+class DailyPromoTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='buyer', password='pass')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_calls_are_served_from_cache(self):
+        self.assertTrue(self.client.get('/v1/promo-codes/has_attempt/').data['has_attempt'])
+        code = self.client.get('/v1/promo-codes/current/').data['code']
+        self.assertEqual(PromoCode.objects.filter(user=self.user).count(), 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/v1/promo-codes/current/').data['code'], code)
+            response = self.client.get('/v1/promo-codes/has_attempt/')
+        self.assertFalse(response.data['has_attempt'])
+
+    def test_cache_miss_uses_day_range(self):
+        yesterday = PromoCode.objects.create(
+            user=self.user, code='OLD00001', discount_percent=5,
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        PromoCode.objects.filter(pk=yesterday.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        today = PromoCode.objects.create(
+            user=self.user, code='NEW00001', discount_percent=5,
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/v1/promo-codes/current/')
+        self.assertEqual(response.data['code'], today.code)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('"created_at" >=', ctx.captured_queries[0]['sql'])
+        self.assertEqual(PromoCode.objects.filter(user=self.user).count(), 2)
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    def test_slower_metric_is_a_regression(self):
+        changes, regressions = compare(
+            {'list': {'p95_ms': 12.0, 'requests_per_second': 100.0}},
+            {'list': {'p95_ms': 10.0, 'requests_per_second': 100.0}},
+            threshold=10,
+        )
+        self.assertEqual(regressions, ['list.p95_ms'])
+        self.assertEqual(changes['list.p95_ms']['change_pct'], 20.0)
+
+    def test_missing_metric_is_a_regression(self):
+        changes, regressions = compare(
+            {'checkout': {'queries_per_request': None, 'errors': 200}},
+            {'checkout': {'queries_per_request': 7.0, 'errors': 0}},
+            threshold=10,
+        )
+        self.assertEqual(regressions, ['checkout.queries_per_request'])
+        self.assertEqual(
+            changes['checkout.queries_per_request'],
+            {'baseline': 7.0, 'current': None, 'change_pct': None}
+        )
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    class FakeConnection:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    def test_idle_connections_are_reused(self):
+        pool = ConnectionPool(max_size=2, timeout=0.01)
+        first = pool.acquire(self.FakeConnection)
+        pool.release(first)
+        self.assertIs(pool.acquire(self.FakeConnection), first)
+        self.assertEqual(pool.stats(), {'max_size': 2, 'created': 1, 'in_use': 1, 'idle': 0})
+
+    def test_acquire_waits_for_a_free_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        held = pool.acquire(self.FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.FakeConnection)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            waiting = executor.submit(pool.acquire, self.FakeConnection)
+            pool.release(held)
+            self.assertIs(waiting.result(), held)
+
+    def test_dead_and_discarded_connections_are_closed(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        dead = pool.acquire(self.FakeConnection)
+        pool.release(dead)
+        fresh = pool.acquire(self.FakeConnection, check=lambda connection: False)
+        self.assertTrue(dead.closed)
+        self.assertIsNot(fresh, dead)
+
+        pool.release(fresh, discard=True)
+        self.assertTrue(fresh.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+        pool.acquire(self.FakeConnection)
+
+
+class RequestMetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(name='Фрукты', slug='fruits')
+
+    def setUp(self):
+        get_cache().clear()
+        get_stats_cache().clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/v1/categories/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="2 queries", serialize;dur=[\d.]+, '
+            r'render;dur=[\d.]+, '
+            r'app;dur=[\d.]+, total;dur=[\d.]+$'
+        )
+
+    @override_settings(QUERY_BUDGETS={'category-list': 0})
+    def test_query_budget(self):
+        with override_settings(QUERY_BUDGET_MODE='raise'):
+            with self.assertRaisesMessage(QueryBudgetExceeded, '2 SQL-запросов при бюджете 0'):
+                self.client.get('/v1/categories/')
+        with override_settings(QUERY_BUDGET_MODE='warn'):
+            with self.assertLogs('api.requests', 'WARNING'):
+                self.client.get('/v1/categories/')
+
+    def test_stats_endpoint_aggregates_per_view(self):
+        self.client.get('/v1/categories/')
+        self.client.get('/v1/categories/')
+        self.assertEqual(self.client.get('/v1/request-stats/').status_code, 401)
+
+        self.client.force_authenticate(
+            CustomUser.objects.create_superuser(username='admin', password='pass')
+        )
+        stats = {row['view']: row for row in self.client.get('/v1/request-stats/').data}
+        self.assertEqual(stats['category-list']['requests'], 2)
+        # Второй ответ из кэша: только чтение версий для ETag.
+        self.assertEqual(stats['category-list']['avg_queries'], 1.5)
+        self.assertEqual(stats['category-list']['max_queries'], 2)
+        self.assertEqual(stats['category-list']['query_budget'], 3)
+        self.assertGreater(stats['category-list']['avg_bytes'], 0)
+
+    def test_log_records_json_body_without_secrets(self):
+        user = CustomUser.objects.create_user(username='buyer', password='pass')
+        product = create_products(Category.objects.get(), 1, images_per_product=0)[0]
+        self.client.force_authenticate(user)
+        with self.assertLogs('api.requests', 'INFO') as logs:
+            self.client.post('/v1/cart/add/', {'product': product.slug}, format='json')
+            self.client.get('/v1/cart/')
+        post, get = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual(post['body'], {'product': product.slug})
+        self.assertNotIn('body', get)
+
+        request = RequestFactory().post(
+            '/v1/auth/jwt/create/',
+            {'username': 'buyer', 'password': 'pass', 'nested': [{'token': 'x', 'a': 1}]},
+            content_type='application/json',
+        )
+        self.assertEqual(
+            loggable_body(request), {'username': 'buyer', 'nested': [{'a': 1}]}
+        )
+        with override_settings(REQUEST_LOG_BODY_MAX_SIZE=10):
+            self.assertIsNone(loggable_body(request))
+
+    def test_serialization_is_timed_separately(self):
+        response = self.client.get('/v1/categories/')
+        metrics = response.wsgi_request.request_metrics
+        self.assertGreater(metrics.serialize_time, 0)
+        self.assertFalse(metrics.serializing)
+        # Ответ из кэша не сериализуется.
+        response = self.client.get('/v1/categories/')
+        self.assertEqual(response.wsgi_request.request_metrics.serialize_time, 0)
+
+
+class TrafficReplayTests(LiveServerTestCase):
+    def setUp(self):
+        seed_dataset({
+            'seed': 1, 'batch_size': 100, 'categories': 2, 'products': 10,
+            'images_per_product': 1, 'reviews_per_product': 1, 'users': 2,
+            'cart_items': 1, 'orders_per_user': 1,
+        })
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write_capture(self, lines):
+        path = os.path.join(self.tmpdir, 'capture.jsonl')
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write('\n'.join(lines))
+        return path
+
+    def test_replay_capture(self):
+        # Три записанных пользователя на два тестовых аккаунта.
+        capture = self.write_capture([
+            '{"ts": 100.0, "method": "GET", "path": "/v1/products/?limit=5", "status": 200}',
+            'GET /v1/orders/ (order-list): 9 SQL-запросов при бюджете 3',
+            '{"ts": 100.01, "method": "GET", "path": "/v1/orders/", "user": 41}',
+            '{"ts": 100.02, "method": "GET", "path": "/v1/orders/", "user": 42}',
+            '{"ts": 100.03, "method": "POST", "path": "/v1/cart/add/", "user": 43,'
+            ' "body": {"product": "bench-product-0"}}',
+            '{"ts": 100.04, "method": "GET", "path": "/v1/products/999999/", "status": 200}',
+        ])
+        out = StringIO()
+        call_command(
+            'replay_traffic', capture, base_url=self.live_server_url,
+            concurrency=2, speed=10, stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['requests'], 5)
+        self.assertEqual(report['skipped_lines'], 1)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['status_mismatches'], 1)
+        routes = report['routes']
+        self.assertEqual(routes['GET product-list']['statuses'], {'200': 1})
+        self.assertEqual(routes['GET order-list']['statuses'], {'200': 2})
+        self.assertEqual(routes['POST cart-add']['statuses'], {'200': 1})
+        self.assertEqual(routes['GET product-detail']['statuses'], {'404': 1})
@@ -0,0 +1,64 @@
+"""Потоковая загрузка картинок через multipart/form-data.
+
+Файл пишется на диск по частям (``TemporaryFileUploadHandler``), а размер
+и разрешение проверяются по мере чтения: разрешение берется из заголовка
+картинки, поэтому слишком большой файл отклоняется до полного
+декодирования и даже до окончания загрузки.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image
+
+# Сколько байт с начала файла держать в памяти в поисках заголовка.
+HEADER_SCAN_LIMIT = 1024 * 1024
+
+
+class ImageTooLarge(MultiPartParserError):
+    pass
+
+
+def check_image_limits(size, width=None, height=None):
+    max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+    if size > max_size:
+        raise ImageTooLarge(f'Файл больше {max_size // 1024} КБ.')
+    max_dimension = settings.IMAGE_UPLOAD_MAX_DIMENSION
+    if width is not None and max(width, height) > max_dimension:
+        raise ImageTooLarge(
+            f'Разрешение картинки больше {max_dimension} px по стороне.'
+        )
+
+
+class LimitedImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл и проверяет лимиты по ходу чтения."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = bytearray()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        check_image_limits(self.received)
+        if self.header is not None:
+            self.check_header(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_header(self, raw_data):
+        self.header += raw_data
+        try:
+            # Image.open читает только заголовок, пиксели не декодируются.
+            with Image.open(BytesIO(self.header)) as image:
+                size = image.size
+        except Image.DecompressionBombError:
+            raise ImageTooLarge('Разрешение картинки слишком большое.')
+        except Exception:
+            # Заголовок еще не дочитан или это не картинка: последнее
+            # отловит валидация поля.
+            if len(self.header) >= HEADER_SCAN_LIMIT:
+                self.header = None
+            return
+        self.header = None
+        check_image_limits(self.received, *size)
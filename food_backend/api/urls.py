@@ -1,6 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .metrics import metrics_view
+
 from .views import (
     CategoryViewSet,
     ProductViewSet,
@@ -8,7 +10,9 @@ from .views import (
     CartItemViewSet,
     OrderViewSet,
     ReviewViewSet,
-    PromoCodeViewSet
+    PromoCodeViewSet,
+    CatalogCacheStatsView,
+    RequestStatsView
 )
 
 router = DefaultRouter()
@@ -23,8 +27,11 @@ review_router = DefaultRouter()
 review_router.register('reviews', ReviewViewSet, basename='reviews')
 
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
     path('v1/', include('djoser.urls')),
     path('v1/', include('djoser.urls.jwt')),
+    path('v1/cache-stats/', CatalogCacheStatsView.as_view(), name='cache-stats'),
+    path('v1/request-stats/', RequestStatsView.as_view(), name='request-stats'),
     path('v1/', include(router.urls)),
     path('v1/products/<int:product_id>/', include(review_router.urls))
 ]
@@ -1,14 +1,18 @@
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework import status, mixins, filters
-from rest_framework.pagination import LimitOffsetPagination
+from rest_framework import status, mixins
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.db import transaction
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
-from food.models import Category, Cart, Product, ProductImage, Order, OrderItem, PromoCode
+from django.db.models import Count, Prefetch, prefetch_related_objects
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser
+from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from food.models import Category, Cart, CartItem, Product, ProductImage, Order, OrderItem, PromoCode, Review
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
@@ -18,6 +22,7 @@ from .serializers import (
     DecreaseCartItemSerializer,
     RemoveCartItemSerializer,
     ClearCartSerializer,
+    BulkCartUpdateSerializer,
     ApplyPromoCodeSerializer,
     RemovePromoCodeSerializer,
     OrderSerializer,
@@ -25,6 +30,15 @@ from .serializers import (
     PromoCodeSerializer
 )
 from .permissions import AdminOnlyCreateUpdateDelete
+from .pagination import (
+    CatalogPagination, CategoryPagination, OrderCursorPagination, ReviewCursorPagination
+)
+from .filters import ProductSearchFilter
+from .cache import get_stats
+from .metrics import CHECKOUTS, CHECKOUT_REVENUE, PROMO_CODES_APPLIED, PROMO_CODES_REDEEMED
+from .conditional import catalog_response
+from .middleware import get_request_stats
+from .uploads import LimitedImageUploadHandler
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -32,40 +46,110 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = (AdminOnlyCreateUpdateDelete,)
 
+    @catalog_response('categories')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @catalog_response('category:{pk}')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by('created_at')
+    queryset = Product.objects.all().order_by('created_at', 'id')
     serializer_class = ProductSerializer
     permission_classes = (AdminOnlyCreateUpdateDelete,)
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
+    filter_backends = (DjangoFilterBackend, ProductSearchFilter)
     filterset_fields = ['category', 'is_available']
     search_fields = ['name']
-    pagination_class = LimitOffsetPagination
+    pagination_class = CatalogPagination
 
-    @action(detail=False, url_path='category/(?P<slug>[\w-]+)', methods=['get'])
+    def get_queryset(self):
+        return self.queryset.defer('search_vector').select_related(
+            'category'
+        ).prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.order_by('id'))
+        )
+
+    @catalog_response('products', 'categories')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @catalog_response('product:{pk}', 'categories')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(
+        detail=False, url_path='category/(?P<slug>[\w-]+)', methods=['get'],
+        pagination_class=CategoryPagination
+    )
+    @catalog_response('category-products:{slug}', 'categories')
     def by_category_slug(self, request, slug=None):
         category = get_object_or_404(Category, slug=slug)
-        products = Product.objects.filter(category=category)
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        products = self.filter_queryset(
+            self.get_queryset().filter(category=category)
+        )
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class ProductImageViewSet(viewsets.ModelViewSet):
-    queryset = ProductImage.objects.all()
+    queryset = ProductImage.objects.select_related('product')
     serializer_class = ProductImageSerializer
     permission_classes = (AdminOnlyCreateUpdateDelete,)
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Multipart-загрузки идут сразу во временный файл с проверкой лимитов.
+        request.upload_handlers = [LimitedImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    @catalog_response('images', 'products')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @catalog_response('image:{pk}', 'products')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class CatalogCacheStatsView(APIView):
+    """Счетчики попаданий и промахов кэша каталога"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_stats())
+
+
+class RequestStatsView(APIView):
+    """Средние SQL-запросы, время и размер ответов по каждому view"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_request_stats())
 
 
 class CartItemViewSet(viewsets.GenericViewSet):
     permission_classes = (IsAuthenticated,)
     serializer_class = CartSerializer
     
+    def get_queryset(self):
+        items = CartItem.objects.select_related(
+            'product__category'
+        ).defer('product__search_vector').prefetch_related(
+            Prefetch('product__images', queryset=ProductImage.objects.order_by('id'))
+        ).order_by('id')
+        return Cart.objects.select_related('user', 'promo_code').prefetch_related(
+            Prefetch('items', queryset=items)
+        )
+
     def get_cart(self):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
+        cart, _ = self.get_queryset().get_or_create(user=self.request.user)
         return cart
 
     def list(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
+        cart = self.get_cart()
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
 
@@ -97,14 +181,9 @@ class CartItemViewSet(viewsets.GenericViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
-        user = request.user
-        try:
-            cart = Cart.objects.get(user=user)
-            if cart.items.count() == 0:
-                cart.clear_promo_code()
-        except Cart.DoesNotExist:
-            pass
-
+        Cart.objects.filter(user=request.user, items__isnull=True).update(
+            promo_code=None, discount_amount=0
+        )
         return Response({"removed": True})
 
     @action(detail=False, methods=['post'])
@@ -112,14 +191,25 @@ class CartItemViewSet(viewsets.GenericViewSet):
         serializer = ClearCartSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        user = request.user
-        try:
-            cart = Cart.objects.get(user=user)
-            cart.clear_promo_code()
-        except Cart.DoesNotExist:
-            pass
+        Cart.objects.filter(user=request.user).update(
+            promo_code=None, discount_amount=0
+        )
         return Response({"cleared": True})
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Пакетное изменение количества товаров в корзине"""
+        serializer = BulkCartUpdateSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(
+            self.get_serializer(self.get_cart()).data,
+            status=status.HTTP_200_OK
+        )
+
     @action(detail=False, methods=['post'], url_path='apply-promo')
     def apply_promo(self, request):
         """Применить промокод к корзине"""
@@ -128,14 +218,18 @@ class CartItemViewSet(viewsets.GenericViewSet):
             data=request.data,
             context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            PROMO_CODES_APPLIED.labels(result='invalid').inc()
+            raise ValidationError(serializer.errors)
         
         promo = serializer.validated_data['code']
         if cart.apply_promo_code(promo):
+            PROMO_CODES_APPLIED.labels(result='applied').inc()
             return Response(
                 self.get_serializer(cart).data,
                 status=status.HTTP_200_OK
             )
+        PROMO_CODES_APPLIED.labels(result='rejected').inc()
         return Response(
             {"detail": "Не удалось применить промокод"},
             status=status.HTTP_400_BAD_REQUEST
@@ -162,24 +256,33 @@ class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-created_at')
+        return self.queryset.filter(
+            user=self.request.user
+        ).select_related('user', 'promo_code').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.order_by('id'))
+        ).order_by('-created_at', '-id')
 
     @action(detail=False, methods=['post'], url_path='create-from-cart')
     @transaction.atomic
     def create_from_cart(self, request):
         user = request.user
         try:
-            cart = user.cart
+            cart = Cart.objects.select_for_update(of=('self',)).select_related(
+                'promo_code'
+            ).get(user=user)
         except Cart.DoesNotExist:
+            CHECKOUTS.labels(result='empty_cart').inc()
             return Response(
                 {"detail": "Корзина пуста"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cart_items = cart.items.select_related('product')
-        if not cart_items.exists():
+        cart_items = list(cart.items.select_related('product'))
+        if not cart_items:
+            CHECKOUTS.labels(result='empty_cart').inc()
             return Response(
                 {"detail": "Корзина пуста"}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -187,6 +290,7 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         for item in cart_items:
             if not item.product.is_available:
+                CHECKOUTS.labels(result='unavailable').inc()
                 return Response(
                     {"detail": f"Продукт {item.product.name} недоступен"},
                     status=status.HTTP_400_BAD_REQUEST
@@ -196,55 +300,96 @@ class OrderViewSet(viewsets.ModelViewSet):
         first_name = request.data.get("first_name", user.first_name)
         last_name = request.data.get("last_name", user.last_name)
         if not delivery_address or not first_name or not last_name:
+            CHECKOUTS.labels(result='incomplete').inc()
             return Response(
                 {"detail": "Необходимо заполнить адрес доставки, имя и фамилию."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order_data = {
-            'user': user,
-            'delivery_address': delivery_address,
-            'total_price': cart.calculate_total(),
-        }
-        
-        if cart.promo_code:
-            order_data['promo_code'] = cart.promo_code
+        if cart.promo_code and not cart.promo_code.mark_as_used():
+            cart.clear_promo_code()
+            CHECKOUTS.labels(result='promo_unavailable').inc()
+            return Response(
+                {"detail": "Промокод уже использован или истек"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        order = Order.objects.create(**order_data)
+        subtotal = sum(item.product.price * item.quantity for item in cart_items)
+        order = Order.objects.create(
+            user=user,
+            delivery_address=delivery_address,
+            total_price=subtotal - cart.discount_amount,
+            promo_code=cart.promo_code
+        )
 
-        for item in cart_items:
-            OrderItem.objects.create(
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
                 product=item.product,
+                product_name=item.product.name,
+                product_slug=item.product.slug,
                 quantity=item.quantity,
                 price_per_item=item.product.price
             )
+            for item in cart_items
+        ])
 
         if cart.promo_code:
-            cart.promo_code.mark_as_used()
+            transaction.on_commit(PROMO_CODES_REDEEMED.inc)
+        transaction.on_commit(lambda: record_checkout(order))
 
         cart.items.all().delete()
         cart.clear_promo_code()
 
+        prefetch_related_objects(
+            [order], Prefetch('items', queryset=OrderItem.objects.order_by('id'))
+        )
         return Response(
             OrderSerializer(order).data,
             status=status.HTTP_201_CREATED
         )
 
 
+def record_checkout(order):
+    CHECKOUTS.labels(result='created').inc()
+    CHECKOUT_REVENUE.inc(float(order.total_price))
+
+
 class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    pagination_class = ReviewCursorPagination
 
-    def get_queryset(self):
+    def get_product_id(self):
         product_id = self.kwargs.get('product_id')
-        product = get_object_or_404(Product, id=product_id)
-        return product.reviews.all().order_by('-created_at')
+        if not Product.objects.filter(pk=product_id).exists():
+            raise Http404
+        return product_id
+
+    def get_queryset(self):
+        return Review.objects.filter(
+            product_id=self.kwargs.get('product_id')
+        ).select_related('user').order_by('-created_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        product_id = self.get_product_id()
+        response = super().list(request, *args, **kwargs)
+        counts = dict(
+            Review.objects.filter(product_id=product_id)
+            .values_list('rating')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        response.data['rating_distribution'] = {
+            str(rating): counts.get(rating, 0)
+            for rating, _ in Review.RATING_CHOICES
+        }
+        return response
 
     def perform_create(self, serializer):
-        product_id = self.kwargs.get('product_id')
-        product = get_object_or_404(Product, id=product_id)
-        serializer.save(user=self.request.user, product=product)
+        serializer.save(
+            user=self.request.user, product_id=self.get_product_id()
+        )
 
     def perform_update(self, serializer):
         if serializer.instance.user != self.request.user:
@@ -281,13 +426,9 @@ class PromoCodeViewSet(
     
     @action(detail=False, methods=['get'])
     def has_attempt(self, request):
-        user = request.user
-        now = timezone.now()
-
-        has_active_promo = PromoCode.objects.filter(
-            user=user,
-            created_at__date=now.date(),
-            expires_at__gt=now
-        ).exists()
+        today_promo = PromoCode.get_today_promo(request.user)
+        has_active_promo = (
+            today_promo is not None and today_promo.expires_at > timezone.now()
+        )
 
         return Response({"has_attempt": not has_active_promo})
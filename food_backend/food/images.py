@@ -0,0 +1,144 @@
+"""Уменьшенные WebP-варианты картинок товаров.
+
+После сохранения ``ProductImage`` варианты ``thumb``/``card``/``detail``
+строятся в пуле потоков, чтобы запрос загрузки не ждал Pillow. Результат
+записывается в ``ProductImage.variants``: имя файла в хранилище и размеры.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumb': (160, 160),
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+VARIANTS_DIR = 'product_images/variants'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def _open(field_file):
+    with field_file.open('rb'):
+        image = Image.open(field_file)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    if image.mode in ('LA', 'PA') or 'transparency' in image.info:
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def render_variants(field_file):
+    """Сохраняет WebP-варианты картинки в ее хранилище."""
+    source = _open(field_file)
+    stem = posixpath.splitext(posixpath.basename(field_file.name))[0]
+    variants = {}
+    for name, size in VARIANTS.items():
+        image = source.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(
+            buffer, 'WEBP', quality=settings.IMAGE_VARIANT_QUALITY, method=4
+        )
+        stored_name = field_file.storage.save(
+            f'{VARIANTS_DIR}/{stem}-{name}.webp', ContentFile(buffer.getvalue())
+        )
+        variants[name] = {
+            'name': stored_name, 'width': image.width, 'height': image.height
+        }
+    return variants
+
+
+def variant_names(variants):
+    return [variant['name'] for variant in variants.values()]
+
+
+def is_referenced(name):
+    """Файл — оригинал или вариант какой-либо картинки."""
+    from .models import ProductImage
+
+    # Имена из содержимого: одинаковые картинки делят и оригинал, и варианты.
+    query = Q(image=name)
+    for variant in VARIANTS:
+        query |= Q(**{f'variants__{variant}__name': name})
+    return ProductImage.objects.filter(query).exists()
+
+
+def delete_unused_files(storage, names):
+    from .models import StoredFile
+
+    for name in set(names):
+        if not name:
+            continue
+        # Та же блокировка, что в ContentAddressedStorage._save: загрузка тех
+        # же байтов либо уже закоммитила ссылку, либо ждет удаления файла.
+        with transaction.atomic():
+            StoredFile.lock(name)
+            if not is_referenced(name):
+                storage.delete(name)
+
+
+def delete_unused_files_on_commit(storage, names):
+    names = list(names)
+    transaction.on_commit(lambda: delete_unused_files(storage, names))
+
+
+def generate_variants(image_id):
+    """Строит варианты картинки и сохраняет их в ``variants``."""
+    from .models import ProductImage
+
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    if product_image is None:
+        return
+    old_variants = product_image.variants
+    # Файлы вариантов остаются заблокированными, пока ссылки на них не
+    # закоммичены.
+    with transaction.atomic():
+        if product_image.image:
+            product_image.variants = render_variants(product_image.image)
+        else:
+            product_image.variants = {}
+        product_image.save(update_fields=['variants'])
+        delete_unused_files_on_commit(
+            product_image.image.storage, variant_names(old_variants)
+        )
+
+
+def generate_variants_in_worker(image_id):
+    try:
+        generate_variants(image_id)
+    except Exception:
+        logger.exception('Не удалось построить варианты картинки %s', image_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(image_id):
+    """Ставит построение вариантов в очередь после коммита транзакции."""
+    if settings.IMAGE_VARIANTS_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(generate_variants_in_worker, image_id)
+        )
+    else:
+        transaction.on_commit(lambda: generate_variants(image_id))
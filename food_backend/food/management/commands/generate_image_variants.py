@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from food.images import generate_variants, generate_variants_in_worker
+from food.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Строит WebP-варианты для картинок товаров, у которых их нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить варианты всех картинок'
+        )
+        parser.add_argument('--workers', type=int, default=1)
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.order_by('pk')
+        if not options['all']:
+            images = images.filter(variants={})
+        image_ids = list(images.values_list('pk', flat=True))
+
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                list(executor.map(generate_variants_in_worker, image_ids))
+        else:
+            for image_id in image_ids:
+                generate_variants(image_id)
+
+        self.stdout.write(f'Обработано картинок: {len(image_ids)}')
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from food.models import PromoCode
+
+
+class Command(BaseCommand):
+    help = 'Выпускает одноразовые промокоды акции, не привязанные к пользователю'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign', help='Название акции')
+        parser.add_argument('count', type=int, help='Сколько кодов выпустить')
+        parser.add_argument('--discount', type=int, required=True, help='Скидка в процентах')
+        parser.add_argument('--days', type=int, default=30, help='Срок действия в днях')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--output', help='Файл, куда записать выпущенные коды')
+
+    def handle(self, *args, **options):
+        if not 0 < options['discount'] <= 100:
+            raise CommandError('Скидка должна быть от 1 до 100 процентов.')
+        if options['count'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError('Количество кодов и размер пачки должны быть больше нуля.')
+
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else None
+        minted = 0
+        try:
+            for codes in PromoCode.mint(
+                options['count'],
+                discount_percent=options['discount'],
+                expires_at=timezone.now() + timedelta(days=options['days']),
+                campaign=options['campaign'],
+                batch_size=options['batch_size'],
+            ):
+                minted += len(codes)
+                if output:
+                    output.write('\n'.join(codes) + '\n')
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Выпущено {minted} из {options["count"]}')
+        finally:
+            if output:
+                output.close()
+
+        self.stdout.write(f'Выпущено промокодов: {minted}')
@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from food.models import Cart, Order, PromoCode
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие и использованные промокоды небольшими пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--grace-days', type=int, default=1,
+            help='Не трогать промокоды, истекшие или выданные позже этого срока'
+        )
+        parser.add_argument(
+            '--interval', type=int,
+            help='Запускаться повторно каждые N секунд'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.reap(
+                options['batch_size'], options['grace_days'], options['pause']
+            )
+            self.stdout.write(f'Удалено промокодов: {deleted}')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def reap(self, batch_size, grace_days, pause):
+        cutoff = timezone.now() - timedelta(days=grace_days)
+        # Промокоды из заказов остаются: по ним видна история скидок.
+        candidates = PromoCode.objects.filter(
+            Q(expires_at__lt=cutoff) | Q(is_used=True, created_at__lt=cutoff)
+        ).filter(
+            ~Exists(Order.objects.filter(promo_code=OuterRef('pk')))
+        ).order_by('pk')
+
+        deleted = 0
+        last_pk = 0
+        while True:
+            # Каждая пачка — своя короткая транзакция; строки, которые
+            # сейчас меняют другие запросы, пропускаются до следующего запуска.
+            with transaction.atomic():
+                batch = list(
+                    candidates.filter(pk__gt=last_pk)
+                    .select_for_update(skip_locked=True)
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if not batch:
+                    break
+                # Иначе SET_NULL оставит в корзине скидку без промокода.
+                Cart.objects.filter(promo_code__in=batch).update(
+                    promo_code=None, discount_amount=0
+                )
+                deleted += PromoCode.objects.filter(pk__in=batch).delete()[1].get(
+                    PromoCode._meta.label, 0
+                )
+            last_pk = batch[-1]
+            if pause:
+                time.sleep(pause)
+        return deleted
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0011_auto_20250519_0132'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:24
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from food.search import is_supported, product_search_vector
+
+
+def create_search_indexes(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS product_search_vector_idx '
+        'ON food_product USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS product_name_trgm_idx '
+        'ON food_product USING gin (name gin_trgm_ops)'
+    )
+    Product = apps.get_model('food', 'Product')
+    Product.objects.update(search_vector=product_search_vector())
+
+
+def drop_search_indexes(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS product_search_vector_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS product_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0012_product_created_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0014_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ),
+    ]
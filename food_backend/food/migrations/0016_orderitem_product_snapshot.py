@@ -0,0 +1,53 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_product_snapshot(apps, schema_editor):
+    OrderItem = apps.get_model('food', 'OrderItem')
+    pending = OrderItem.objects.filter(
+        product__isnull=False, product_name=''
+    ).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(
+            pending.filter(pk__gt=last_pk)
+            .select_related('product')
+            .only('pk', 'product__name', 'product__slug')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for item in batch:
+            item.product_name = item.product.name
+            item.product_slug = item.product.slug
+        OrderItem.objects.bulk_update(batch, ['product_name', 'product_slug'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    # Каждая пачка коммитится сама: одна транзакция на все позиции заказов
+    # держала бы блокировки строк до конца миграции. Повторный запуск
+    # продолжит с незаполненных строк.
+    atomic = False
+
+    dependencies = [
+        ('food', '0015_order_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_slug',
+            field=models.SlugField(blank=True, db_index=False, default=''),
+        ),
+        migrations.RunPython(
+            backfill_product_snapshot, migrations.RunPython.noop
+        ),
+    ]
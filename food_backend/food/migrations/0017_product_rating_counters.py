@@ -0,0 +1,58 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:25
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, Sum
+from django.db.models.functions import Cast
+
+BATCH_SIZE = 1000
+
+
+def fill_rating_counters(apps, schema_editor):
+    Product = apps.get_model('food', 'Product')
+    Review = apps.get_model('food', 'Review')
+    totals = Review.objects.values('product').annotate(
+        rating_sum=Sum('rating'), rating_count=Count('id')
+    ).order_by()
+    batch = []
+    for row in totals.iterator():
+        batch.append(Product(
+            pk=row['product'],
+            rating_sum=row['rating_sum'],
+            rating_count=row['rating_count'],
+        ))
+        if len(batch) == BATCH_SIZE:
+            Product.objects.bulk_update(batch, ['rating_sum', 'rating_count'])
+            batch = []
+    Product.objects.bulk_update(batch, ['rating_sum', 'rating_count'])
+
+
+def fill_average_rating(apps, schema_editor):
+    Product = apps.get_model('food', 'Product')
+    Product.objects.filter(rating_count__gt=0).update(
+        average_rating=Cast(F('rating_sum'), FloatField()) / F('rating_count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0016_orderitem_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_counters, fill_average_rating),
+        migrations.RemoveField(
+            model_name='product',
+            name='average_rating',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0017_product_rating_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'created_at'], name='review_product_created_idx'),
+        ),
+    ]
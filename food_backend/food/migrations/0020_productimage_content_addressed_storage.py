@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:32
+
+from django.db import migrations, models
+import food.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0019_productimage_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=food.storage.ContentAddressedStorage(), upload_to='product_images/'),
+        ),
+    ]
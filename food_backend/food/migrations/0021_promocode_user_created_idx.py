@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0020_productimage_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='promocode',
+            index=models.Index(fields=['user', 'created_at'], name='promo_user_created_idx'),
+        ),
+    ]
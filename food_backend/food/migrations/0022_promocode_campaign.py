@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0021_promocode_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocode',
+            name='campaign',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='promocode',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promo_codes', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
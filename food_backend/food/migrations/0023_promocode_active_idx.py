@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0022_promocode_campaign'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='promocode',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['user', 'expires_at'], name='promo_active_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import migrations
+
+from food.search import (
+    create_trigger_sql, drop_trigger_sql, is_supported, product_search_vector
+)
+
+
+def create_trigger(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    for sql in create_trigger_sql(settings.PRODUCT_SEARCH_CONFIG):
+        schema_editor.execute(sql)
+    # Товары, созданные через bulk_create до триггера, остались без вектора.
+    Product = apps.get_model('food', 'Product')
+    Product.objects.update(search_vector=product_search_vector())
+
+
+def drop_trigger(apps, schema_editor):
+    if not is_supported(schema_editor.connection):
+        return
+    for sql in drop_trigger_sql():
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0023_promocode_active_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
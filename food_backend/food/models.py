@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 from datetime import timedelta
 import random
+import secrets
+from django.core.cache import cache
+from .storage import ContentAddressedStorage
 
 
 class CustomUser(AbstractUser):
@@ -15,6 +19,7 @@ class CustomUser(AbstractUser):
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -28,22 +33,117 @@ class Product(models.Model):
     is_available = models.BooleanField(default=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     created_at = models.DateTimeField(auto_now_add=True)
-    average_rating = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return 0.0
+        return round(self.rating_sum / self.rating_count, 2)
+
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='product_images/')
+    image = models.ImageField(
+        upload_to='product_images/', storage=ContentAddressedStorage()
+    )
+    variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Картинка {self.product.name}"
 
+    def save(self, *args, **kwargs):
+        # Блокировка имени файла из хранилища держится до коммита строки.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class StoredFile(models.Model):
+    """Имя файла в хранилище с адресацией по содержимому.
+
+    Строка служит блокировкой: загрузка, переиспользующая файл, и удаление
+    файла без ссылок держат ее до конца своих транзакций, поэтому удаление
+    не пропустит еще не закоммиченную ссылку.
+    """
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def lock(cls, name):
+        cls.objects.bulk_create([cls(name=name)], ignore_conflicts=True)
+        # UPDATE, а не SELECT FOR UPDATE: SQLite его не поддерживает.
+        cls.objects.filter(name=name).update(name=models.F('name'))
+
+
+class CatalogVersion(models.Model):
+    """Счетчик изменений области каталога для условных GET-запросов"""
+    scope = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+    @classmethod
+    def bump(cls, *scopes):
+        scopes = set(scopes)
+        now = timezone.now()
+        updated = cls.objects.filter(scope__in=scopes).update(
+            version=models.F('version') + 1,
+            updated_at=now
+        )
+        if updated < len(scopes):
+            # Строки, созданные конкурентами после UPDATE, не обновлены этим
+            # вызовом: свои узнаются по updated_at. Если строку вставили
+            # между SELECT и INSERT, версия увеличивается поверх нее, иначе
+            # два изменения дали бы одну версию.
+            missing = scopes - set(
+                cls.objects.filter(scope__in=scopes, updated_at=now)
+                .values_list('scope', flat=True)
+            )
+            for scope in missing:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(scope=scope, version=1, updated_at=now)
+                except IntegrityError:
+                    cls.objects.filter(scope=scope).update(
+                        version=models.F('version') + 1,
+                        updated_at=now
+                    )
+
+
+TODAY_PROMO_KEY = 'promo:today:{user_id}:{date}'
+NO_PROMO = 'no-promo'
+NO_PROMO_TIMEOUT = 60
+
 
 class PromoCode(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='promo_codes')
+    CODE_CHARS = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+    CODE_LENGTH = 8
+    # Сколько кодов проверять одним запросом ``code IN (...)``.
+    LOOKUP_CHUNK_SIZE = 1000
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='promo_codes'
+    )
+    campaign = models.CharField(max_length=50, blank=True, db_index=True)
     code = models.CharField(max_length=20, unique=True)
     discount_percent = models.PositiveIntegerField()
     is_used = models.BooleanField(default=False)
@@ -52,22 +152,135 @@ class PromoCode(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='promo_user_created_idx'),
+            models.Index(
+                fields=['user', 'expires_at'],
+                condition=models.Q(is_used=False),
+                name='promo_active_idx'
+            ),
+        ]
     
     def __str__(self):
-        return f"{self.code} ({self.discount_percent}%) для {self.user.username}"
+        owner = self.user.username if self.user_id else f"акции {self.campaign}"
+        return f"{self.code} ({self.discount_percent}%) для {owner}"
     
     @classmethod
     def generate_code(cls):
         """Генерация случайного кода"""
-        chars = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
-        return ''.join(random.choice(chars) for _ in range(8))
+        return ''.join(
+            secrets.choice(cls.CODE_CHARS) for _ in range(cls.CODE_LENGTH)
+        )
+
+    @classmethod
+    def taken_codes(cls, codes):
+        """Коды из набора, которые уже есть в базе."""
+        codes = list(codes)
+        taken = set()
+        for start in range(0, len(codes), cls.LOOKUP_CHUNK_SIZE):
+            taken.update(
+                cls.objects.filter(
+                    code__in=codes[start:start + cls.LOOKUP_CHUNK_SIZE]
+                ).values_list('code', flat=True)
+            )
+        return taken
+
+    @classmethod
+    def generate_codes(cls, count, exclude=()):
+        """Набор из count новых кодов, которых нет в базе.
+
+        Коллизии проверяются одним запросом на пачку, перегенерируются
+        только совпавшие коды.
+        """
+        codes = set()
+        exclude = set(exclude)
+        while len(codes) < count:
+            candidates = set()
+            while len(candidates) < count - len(codes):
+                code = cls.generate_code()
+                if code not in codes and code not in exclude:
+                    candidates.add(code)
+            codes |= candidates - cls.taken_codes(candidates)
+        return codes
+
+    @classmethod
+    def mint(cls, count, discount_percent, expires_at, campaign='', batch_size=5000):
+        """Выпускает count кодов акции пачками через bulk_create.
+
+        Генератор: после вставки каждой пачки отдает список ее кодов.
+        """
+        minted = 0
+        while minted < count:
+            size = min(batch_size, count - minted)
+            codes = cls.generate_codes(size)
+            while True:
+                try:
+                    with transaction.atomic():
+                        cls.objects.bulk_create(
+                            cls(
+                                code=code,
+                                campaign=campaign,
+                                discount_percent=discount_percent,
+                                expires_at=expires_at,
+                            )
+                            for code in codes
+                        )
+                    break
+                except IntegrityError:
+                    # Часть кодов заняли параллельно: заменяем только их.
+                    free = codes - cls.taken_codes(codes)
+                    if free == codes:
+                        raise
+                    codes = free | cls.generate_codes(size - len(free), exclude=free)
+            minted += size
+            yield sorted(codes)
+
+    @staticmethod
+    def _today():
+        """Границы текущих суток UTC и число секунд до полуночи."""
+        now = timezone.now()
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+        return start, end, int((end - now).total_seconds()) + 1
+
+    @staticmethod
+    def _today_key(user_id, start):
+        return TODAY_PROMO_KEY.format(user_id=user_id, date=start.date().isoformat())
+
+    @classmethod
+    def remember_today_promo(cls, promo):
+        start, _, timeout = cls._today()
+        cache.set(cls._today_key(promo.user_id, start), promo, timeout)
+
+    @classmethod
+    def get_today_promo(cls, user, refresh_missing=False):
+        """Промокод, выданный пользователю сегодня (по UTC), или None.
+
+        Найденный промокод кэшируется до полуночи UTC. Отсутствие
+        промокода кэшируется ненадолго: его могли выдать в другом процессе.
+        """
+        start, end, timeout = cls._today()
+        key = cls._today_key(user.pk, start)
+        cached = cache.get(key)
+        if cached == NO_PROMO and not refresh_missing:
+            return None
+        if cached is not None and cached != NO_PROMO:
+            return cached
+
+        promo = cls.objects.filter(
+            user=user, created_at__gte=start, created_at__lt=end
+        ).order_by('-created_at').first()
+        if promo is None:
+            cache.set(key, NO_PROMO, min(NO_PROMO_TIMEOUT, timeout))
+        else:
+            cache.set(key, promo, timeout)
+        return promo
     
     @classmethod
     def create_daily_promo(cls, user):
-        last_promo = cls.objects.filter(user=user).order_by('-created_at').first()
-
-        if last_promo and last_promo.created_at.date() == timezone.now().date():
-            return last_promo
+        today_promo = cls.get_today_promo(user, refresh_missing=True)
+        if today_promo is not None:
+            return today_promo
 
         if random.random() < 0.3:
             zero_promo = cls.objects.create(
@@ -77,6 +290,7 @@ class PromoCode(models.Model):
                 is_used=True,
                 expires_at=timezone.now() + timedelta(days=1)
             )
+            cls.remember_today_promo(zero_promo)
             return zero_promo
 
 
@@ -91,18 +305,27 @@ class PromoCode(models.Model):
             discount_percent=discount,
             expires_at=timezone.now() + timedelta(days=1)
         )
+        cls.remember_today_promo(promo)
         return promo
 
     def is_usable(self, user):
         return (
-            self.user == user and
+            self.user_id in (None, user.pk) and
             not self.is_used and
             timezone.now() < self.expires_at
         )
 
     def mark_as_used(self):
+        """Гасит промокод одним UPDATE; False, если его уже погасили или он истек.
+
+        Код акции может быть применен в корзинах многих пользователей,
+        поэтому проверка и запись должны быть одной операцией.
+        """
+        redeemed = PromoCode.objects.filter(
+            pk=self.pk, is_used=False, expires_at__gt=timezone.now()
+        ).update(is_used=True)
         self.is_used = True
-        self.save()
+        return bool(redeemed)
 
 
 class Cart(models.Model):
@@ -177,6 +400,11 @@ class Order(models.Model):
         related_name='orders'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Заказ #{self.id} пользователя {self.user.username}"
 
@@ -184,11 +412,14 @@ class Order(models.Model):
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
+    # Снимок товара на момент оформления заказа
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    product_slug = models.SlugField(blank=True, default='', db_index=False)
     quantity = models.PositiveIntegerField()
     price_per_item = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
-        product_name = self.product.name if self.product else "Продукт удален"
+        product_name = self.product_name or "Продукт удален"
         return f"{self.quantity} x {product_name}"
 
 class Review(models.Model):
@@ -202,6 +433,9 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='review_product_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.rating}★ от {self.user.username} на {self.product.name}"
@@ -0,0 +1,63 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+
+WORD = re.compile(r'\w+')
+TRIGGER_NAME = 'food_product_search_vector_trigger'
+FUNCTION_NAME = 'food_product_search_vector_update'
+
+
+def is_supported(connection):
+    """Полнотекстовый поиск доступен только на PostgreSQL."""
+    return connection.vendor == 'postgresql'
+
+
+def product_search_vector():
+    config = settings.PRODUCT_SEARCH_CONFIG
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector('description', weight='B', config=config)
+    )
+
+
+def prefix_query(text):
+    """tsquery, где каждое слово — префикс: "ябл мол" -> "ябл:* & мол:*".
+
+    Поиск идет по мере ввода, и недописанное слово тоже должно находить.
+    В запрос попадают только буквы и цифры, поэтому он всегда корректен.
+    """
+    return ' & '.join(f'{word}:*' for word in WORD.findall(text.lower()))
+
+
+def create_trigger_sql(config):
+    """Триггер держит search_vector актуальным при любой записи, включая
+    ``bulk_create`` и ``QuerySet.update``, которые не вызывают сигналы.
+    """
+    if not WORD.fullmatch(config):
+        raise ValueError(f'Некорректная конфигурация поиска: {config}')
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {FUNCTION_NAME}() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('{config}'::regconfig, coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('{config}'::regconfig, coalesce(NEW.description, '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f'DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON food_product',
+        f"""
+        CREATE TRIGGER {TRIGGER_NAME}
+        BEFORE INSERT OR UPDATE OF name, description ON food_product
+        FOR EACH ROW EXECUTE PROCEDURE {FUNCTION_NAME}()
+        """,
+    ]
+
+
+def drop_trigger_sql():
+    return [
+        f'DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON food_product',
+        f'DROP FUNCTION IF EXISTS {FUNCTION_NAME}()',
+    ]
@@ -1,12 +1,63 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from django.db import models
-from .models import Review
-
-@receiver([post_save, post_delete], sender=Review)
-def update_product_rating(sender, instance, **kwargs):
-    product = instance.product
-    reviews = product.reviews.all()
-    avg = reviews.aggregate(avg_rating=models.Avg('rating'))['avg_rating'] or 0
-    product.average_rating = round(avg, 2)
-    product.save()
+from django.db.models import F
+from .images import delete_unused_files_on_commit, schedule_variants, variant_names
+from .models import Product, ProductImage, Review
+
+
+def change_product_rating(product_id, rating_delta, count_delta):
+    product = Product(pk=product_id)
+    product.rating_sum = F('rating_sum') + rating_delta
+    product.rating_count = F('rating_count') + count_delta
+    product.save(update_fields=['rating_sum', 'rating_count', 'updated_at'])
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._saved_rating = instance.rating if instance.pk else None
+
+
+@receiver(post_save, sender=Review)
+def update_product_rating(sender, instance, created, **kwargs):
+    if created:
+        change_product_rating(instance.product_id, instance.rating, 1)
+    elif instance._saved_rating is not None and instance._saved_rating != instance.rating:
+        change_product_rating(
+            instance.product_id, instance.rating - instance._saved_rating, 0
+        )
+    instance._saved_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def remove_product_rating(sender, instance, **kwargs):
+    rating = instance._saved_rating
+    if rating is None:
+        rating = instance.rating
+    change_product_rating(instance.product_id, -rating, -1)
+
+
+@receiver(post_init, sender=ProductImage)
+def remember_image_name(sender, instance, **kwargs):
+    image = instance.__dict__.get('image')
+    instance._saved_image = getattr(image, 'name', image) if instance.pk else None
+
+
+@receiver(post_save, sender=ProductImage)
+def build_image_variants(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if created or instance.image.name != instance._saved_image:
+        schedule_variants(instance.pk)
+        if instance._saved_image:
+            # Старые варианты удалит generate_variants, когда построит новые.
+            delete_unused_files_on_commit(instance.image.storage, [instance._saved_image])
+    instance._saved_image = instance.image.name
+
+
+@receiver(post_delete, sender=ProductImage)
+def remove_image_files(sender, instance, **kwargs):
+    if instance.image.name:
+        delete_unused_files_on_commit(
+            instance.image.storage,
+            [instance.image.name, *variant_names(instance.variants)]
+        )
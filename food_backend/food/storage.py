@@ -0,0 +1,61 @@
+"""Хранилище файлов с адресацией по содержимому.
+
+Имя файла — sha256 его содержимого, поэтому одинаковые загрузки
+занимают на диске один файл, а по одному имени всегда отдаются одни и те
+же байты: такие файлы можно кэшировать навсегда.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Сохраняет файл в ``<каталог>/<2 символа хэша>/<sha256><расширение>``."""
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save, а совпадение
+        # имен означает совпадение байтов.
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredFile
+
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        temp_dir = self.path(directory)
+        os.makedirs(temp_dir, exist_ok=True)
+
+        # Хэш считается на лету, пока файл пишется во временный файл
+        # рядом с итоговым: переименование внутри одной ФС атомарно.
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+            full_path = self.path(name)
+            # Внутри транзакции сохранения строки блокировка держится до ее
+            # коммита: delete_unused_files не удалит переиспользованный файл.
+            with transaction.atomic():
+                StoredFile.lock(name)
+                if os.path.exists(full_path):
+                    os.remove(temp_path)
+                else:
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                    os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
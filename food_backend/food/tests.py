@@ -1,3 +1,339 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .images import VARIANTS, delete_unused_files
+from .models import (
+    Cart, CatalogVersion, CustomUser, Order, Product, ProductImage, PromoCode, Review,
+    StoredFile
+)
+
+
+class ProductRatingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Яблоко', slug='apple', price=Decimal('10.00')
+        )
+        cls.users = [
+            CustomUser.objects.create_user(username=f'user{i}', password='pass')
+            for i in range(3)
+        ]
+
+    def rating(self):
+        self.product.refresh_from_db()
+        return self.product.rating_sum, self.product.rating_count
+
+    def test_counters_follow_review_writes(self):
+        first = Review.objects.create(user=self.users[0], product=self.product, rating=5)
+        Review.objects.create(user=self.users[1], product=self.product, rating=2)
+        self.assertEqual(self.rating(), (7, 2))
+        self.assertEqual(self.product.average_rating, 3.5)
+
+        review = Review.objects.get(pk=first.pk)
+        review.rating = 3
+        review.save()
+        review.save()
+        self.assertEqual(self.rating(), (5, 2))
+
+        review.delete()
+        self.assertEqual(self.rating(), (2, 1))
+
+    def test_product_update_touches_only_counters(self):
+        review = Review.objects.create(user=self.users[0], product=self.product, rating=4)
+        review.rating = 1
+        with CaptureQueriesContext(connection) as ctx:
+            review.save()
+        product_updates = [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith('UPDATE "food_product"')
+        ]
+        self.assertEqual(len(product_updates), 1)
+        self.assertIn('"rating_sum"', product_updates[0])
+        self.assertNotIn('"name"', product_updates[0])
+        self.assertEqual(self.rating(), (1, 1))
+
+
+class CatalogVersionTests(TestCase):
+    def versions(self):
+        return dict(CatalogVersion.objects.values_list('scope', 'version'))
+
+    def test_bump_creates_and_increments(self):
+        CatalogVersion.bump('products', 'product:1')
+        CatalogVersion.bump('products')
+        self.assertEqual(self.versions(), {'products': 2, 'product:1': 1})
+
+    def test_row_created_concurrently_is_still_bumped(self):
+        CatalogVersion.objects.create(scope='products', version=1)
+        update = QuerySet.update
+        calls = []
+
+        def racing_update(queryset, **kwargs):
+            calls.append(kwargs)
+            # Первый UPDATE выполнился до того, как конкурент вставил строку.
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            CatalogVersion.bump('products')
+        self.assertEqual(self.versions(), {'products': 2})
+
+
+@override_settings(IMAGE_VARIANTS_ASYNC=False)
+class ProductImageVariantsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Яблоко', slug='apple', price=Decimal('10.00')
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, size=(2000, 1000)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG')
+        return SimpleUploadedFile('apple.jpg', buffer.getvalue(), 'image/jpeg')
+
+    def test_variants_are_built_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image=self.upload())
+        image.refresh_from_db()
+        self.assertEqual(set(image.variants), set(VARIANTS))
+        self.assertEqual(
+            (image.variants['card']['width'], image.variants['card']['height']),
+            (480, 240)
+        )
+        for variant in image.variants.values():
+            self.assertTrue(variant['name'].endswith('.webp'))
+            self.assertTrue(image.image.storage.exists(variant['name']))
+
+        with mock.patch('food.signals.schedule_variants') as schedule:
+            image.save()
+        schedule.assert_not_called()
+
+        variants = image.variants
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        for variant in variants.values():
+            self.assertFalse(image.image.storage.exists(variant['name']))
+
+    def test_small_images_are_not_upscaled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(
+                product=self.product, image=self.upload(size=(300, 200))
+            )
+        image.refresh_from_db()
+        self.assertEqual(
+            (image.variants['detail']['width'], image.variants['detail']['height']),
+            (300, 200)
+        )
+
+    def test_command_backfills_missing_variants(self):
+        image = ProductImage(product=self.product)
+        image.image.save('apple.jpg', self.upload(), save=False)
+        ProductImage.objects.bulk_create([image])
+
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(
+            set(ProductImage.objects.get().variants), set(VARIANTS)
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        other = Product.objects.create(name='Груша', slug='pear', price=Decimal('10.00'))
+        content = self.upload().read()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ProductImage.objects.create(
+                product=self.product,
+                image=SimpleUploadedFile('a.jpg', content, 'image/jpeg')
+            )
+            second = ProductImage.objects.create(
+                product=other, image=SimpleUploadedFile('b.JPG', content, 'image/jpeg')
+            )
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(first.image.name, f'product_images/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second.image.name, first.image.name)
+        storage = first.image.storage
+        self.assertEqual(
+            os.listdir(storage.path(f'product_images/{digest[:2]}')), [f'{digest}.jpg']
+        )
+
+        second.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        for variant in second.variants.values():
+            self.assertTrue(storage.exists(variant['name']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+
+    def run_with_on_commit(self, func):
+        # captureOnCommitCallbacks в Django 3.2 не выполняет колбэки,
+        # добавленные другими колбэками (generate_variants).
+        with self.captureOnCommitCallbacks() as callbacks:
+            func()
+        while callbacks:
+            with self.captureOnCommitCallbacks() as nested:
+                for callback in callbacks:
+                    callback()
+            callbacks = nested
+
+    def test_file_lock_guards_reuse_and_deletion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image=self.upload())
+        self.assertTrue(StoredFile.objects.filter(name=image.image.name).exists())
+
+        calls = []
+        with mock.patch.object(
+            StoredFile, 'lock', side_effect=lambda name: calls.append(('lock', name))
+        ), mock.patch(
+            'food.images.is_referenced',
+            side_effect=lambda name: calls.append(('check', name)) or True
+        ):
+            delete_unused_files(image.image.storage, [image.image.name])
+        self.assertEqual(calls, [('lock', image.image.name), ('check', image.image.name)])
+
+    def test_changing_shared_image_keeps_other_rows_files(self):
+        content = self.upload().read()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ProductImage.objects.create(
+                product=self.product, image=SimpleUploadedFile('a.jpg', content, 'image/jpeg')
+            )
+            second = ProductImage.objects.create(
+                product=self.product, image=SimpleUploadedFile('b.jpg', content, 'image/jpeg')
+            )
+        first.refresh_from_db()
+        second.refresh_from_db()
+        storage = first.image.storage
+
+        first.image = self.upload(size=(300, 300))
+        self.run_with_on_commit(first.save)
+        first.refresh_from_db()
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertTrue(storage.exists(second.image.name))
+        for variant in second.variants.values():
+            self.assertTrue(storage.exists(variant['name']))
+
+        old_name, old_variants = second.image.name, second.variants
+        second.image = first.image.name
+        self.run_with_on_commit(second.save)
+        self.assertFalse(storage.exists(old_name))
+        for variant in old_variants.values():
+            self.assertFalse(storage.exists(variant['name']))
+        for variant in first.variants.values():
+            self.assertTrue(storage.exists(variant['name']))
+
+
+class PromoCodeMintTests(TestCase):
+    def test_mint_campaign_codes(self):
+        out = StringIO()
+        call_command(
+            'mint_promo_codes', 'spring', '50', discount=10, batch_size=20, stdout=out
+        )
+        self.assertIn('50', out.getvalue())
+        promos = PromoCode.objects.filter(campaign='spring')
+        self.assertEqual(promos.count(), 50)
+        self.assertTrue(all(promo.user_id is None for promo in promos))
+        user = CustomUser.objects.create_user(username='buyer', password='pass')
+        self.assertTrue(promos.first().is_usable(user))
+
+    def test_only_colliding_codes_are_regenerated(self):
+        PromoCode.objects.create(
+            code='TAKEN001', discount_percent=5, expires_at=timezone.now()
+        )
+        drawn = iter(['TAKEN001', 'FRESH001', 'FRESH002', 'FRESH003'])
+        with mock.patch.object(PromoCode, 'generate_code', side_effect=lambda: next(drawn)):
+            with CaptureQueriesContext(connection) as ctx:
+                batches = list(PromoCode.mint(
+                    2, discount_percent=5, expires_at=timezone.now(), campaign='x'
+                ))
+        self.assertEqual(batches, [['FRESH001', 'FRESH002']])
+        lookups = [
+            query for query in ctx.captured_queries if query['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(len(lookups), 2)
+        self.assertIn("'FRESH002'", lookups[1]['sql'])
+        self.assertNotIn("'FRESH001'", lookups[1]['sql'])
+
+    def test_insert_race_retries_with_fresh_codes(self):
+        real_taken_codes = PromoCode.taken_codes
+        checks = []
+
+        def taken_then_raced(codes):
+            # Параллельный процесс успевает занять код после проверки.
+            taken = real_taken_codes(codes)
+            if not checks:
+                PromoCode.objects.create(
+                    code='RACE0001', discount_percent=5, expires_at=timezone.now()
+                )
+            checks.append(set(codes))
+            return taken
+
+        drawn = iter(['RACE0001', 'SAFE0001', 'SAFE0002'])
+        with mock.patch.object(PromoCode, 'generate_code', side_effect=lambda: next(drawn)), \
+                mock.patch.object(PromoCode, 'taken_codes', side_effect=taken_then_raced):
+            batches = list(PromoCode.mint(
+                2, discount_percent=5, expires_at=timezone.now(), campaign='x'
+            ))
+        self.assertEqual(batches, [['SAFE0001', 'SAFE0002']])
+        self.assertEqual(PromoCode.objects.filter(campaign='x').count(), 2)
+
+
+class PromoCodeReaperTests(TestCase):
+    def test_reaper_deletes_stale_unreferenced_codes(self):
+        user = CustomUser.objects.create_user(username='buyer', password='pass')
+        now = timezone.now()
+
+        def promo(code, expires_in, is_used=False, created_ago=timedelta(0)):
+            promo = PromoCode.objects.create(
+                user=user, code=code, discount_percent=10,
+                expires_at=now + expires_in, is_used=is_used
+            )
+            PromoCode.objects.filter(pk=promo.pk).update(created_at=now - created_ago)
+            return promo
+
+        expired = promo('EXPIRED1', -timedelta(days=3))
+        in_cart = promo('INCART01', -timedelta(days=3))
+        in_order = promo('INORDER1', -timedelta(days=3), is_used=True)
+        used_old = promo('USEDOLD1', timedelta(days=1), True, timedelta(days=2))
+        used_today = promo('USEDTDY1', timedelta(days=1), is_used=True)
+        active = promo('ACTIVE01', timedelta(days=1))
+
+        Cart.objects.create(user=user, promo_code=in_cart, discount_amount=Decimal('5.00'))
+        Order.objects.create(
+            user=user, delivery_address='Казань', total_price=Decimal('1.00'),
+            promo_code=in_order
+        )
+
+        out = StringIO()
+        call_command('reap_promo_codes', batch_size=1, stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(
+            set(PromoCode.objects.values_list('code', flat=True)),
+            {in_order.code, used_today.code, active.code}
+        )
+        cart = Cart.objects.get(user=user)
+        self.assertIsNone(cart.promo_code)
+        self.assertEqual(cart.discount_amount, 0)
+        self.assertFalse(PromoCode.objects.filter(pk__in=[expired.pk, used_old.pk]).exists())
@@ -0,0 +1,116 @@
+"""PostgreSQL-бэкенд с проверкой постоянных соединений и пулом.
+
+``CONN_HEALTH_CHECKS``: постоянное соединение (``CONN_MAX_AGE`` > 0)
+проверяется перед первым запросом в каждом HTTP-запросе, чтобы не
+получить ошибку на соединении, которое закрыл сервер или балансировщик.
+Аналог настройки из Django 4.1.
+
+``POOL = {'MAX_SIZE': ..., 'TIMEOUT': ...}``: соединения берутся из пула
+процесса и возвращаются в него вместо закрытия.
+"""
+import threading
+
+from django.db.backends.postgresql import base as postgresql
+from psycopg2 import extensions
+
+from .pool import ConnectionPool, PoolTimeout
+
+Database = postgresql.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings_dict):
+    options = settings_dict.get('POOL')
+    if not options:
+        return None
+    # Ключ по параметрам подключения: служебные соединения Django
+    # (например, к базе postgres при создании тестовой) не смешиваются.
+    key = tuple(
+        settings_dict.get(name) for name in ('NAME', 'USER', 'HOST', 'PORT')
+    )
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 5),
+            )
+        return _pools[key]
+
+
+class DatabaseWrapper(postgresql.DatabaseWrapper):
+    health_check_done = False
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    @property
+    def connection_pool(self):
+        return get_pool(self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.connection_pool
+        if pool is None:
+            connection = super().get_new_connection(conn_params)
+        else:
+            try:
+                connection = pool.acquire(
+                    lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                    check=self._is_alive if self.health_check_enabled else None,
+                )
+            except PoolTimeout as exc:
+                raise Database.OperationalError(str(exc)) from exc
+            self.isolation_level = self.settings_dict['OPTIONS'].get(
+                'isolation_level', connection.isolation_level
+            )
+        self.health_check_done = True
+        return connection
+
+    @staticmethod
+    def _is_alive(connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        pool = self.connection_pool
+        if pool is None:
+            return super()._close()
+        connection = self.connection
+        discard = bool(connection.closed)
+        if not discard:
+            status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except Database.Error:
+                    discard = True
+        pool.release(connection, discard=discard)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Вызывается в начале и в конце каждого HTTP-запроса.
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.health_check_enabled
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
@@ -0,0 +1,86 @@
+"""Пул соединений с БД внутри одного процесса.
+
+Размер пула ограничен: когда все соединения заняты, поток ждет
+освобождения не дольше ``timeout`` секунд, а затем получает ``PoolTimeout``.
+Свободные соединения выдаются в порядке LIFO, чтобы редко используемые
+успевали закрываться на стороне сервера, а не "прогревались" по кругу.
+"""
+import threading
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+
+    def acquire(self, connect, check=None):
+        """Выдает свободное соединение или открывает новое через ``connect``.
+
+        ``check(connection)`` проверяет свободное соединение перед выдачей,
+        непрошедшие проверку закрываются.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f'Все {self.max_size} соединений пула заняты дольше {self.timeout} с.'
+            )
+        try:
+            connection = self._take_idle(check)
+            if connection is None:
+                connection = connect()
+                with self._lock:
+                    self.created += 1
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return connection
+
+    def _take_idle(self, check):
+        while True:
+            try:
+                connection = self._idle.pop()
+            except IndexError:
+                return None
+            if check is None or check(connection):
+                return connection
+            self._close(connection)
+
+    def release(self, connection, discard=False):
+        """Возвращает соединение в пул; ``discard`` закрывает его."""
+        if discard:
+            self._close(connection)
+        else:
+            self._idle.append(connection)
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def close_idle(self):
+        while self._idle:
+            self._close(self._idle.pop())
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        return {
+            'max_size': self.max_size,
+            'created': self.created,
+            'in_use': self.in_use,
+            'idle': len(self._idle),
+        }
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'drf_yasg',
     'rest_framework',
     'corsheaders',
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'food.CustomUser'
 
 MIDDLEWARE = [
+    'api.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,15 +107,30 @@ WSGI_APPLICATION = 'food_backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'food_backend.db',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Постоянные соединения: сколько секунд держать соединение (0 —
+        # закрывать после каждого запроса) и проверять ли его перед
+        # использованием.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
     }
 }
 
+# Пул соединений процесса вместо постоянного соединения на поток.
+if int(os.getenv('DB_POOL_MAX_SIZE', 0)):
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE')),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+        },
+    })
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -160,3 +177,95 @@ DJOSER = {
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'DEFAULT_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('DEFAULT_CACHE_LOCATION', ''),
+    },
+    'catalog': {
+        'BACKEND': os.getenv(
+            'CATALOG_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CATALOG_CACHE_LOCATION', 'catalog'),
+    },
+    'stats': {
+        'BACKEND': os.getenv(
+            'REQUEST_STATS_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('REQUEST_STATS_CACHE_LOCATION', 'stats'),
+    },
+}
+
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 300))
+
+PRODUCT_SEARCH_CONFIG = os.getenv('PRODUCT_SEARCH_CONFIG', 'russian')
+
+IMAGE_VARIANTS_ASYNC = os.getenv('IMAGE_VARIANTS_ASYNC', '1') == '1'
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_DIMENSION = int(os.getenv('IMAGE_UPLOAD_MAX_DIMENSION', 6000))
+
+REQUEST_STATS_CACHE_ALIAS = 'stats'
+# JSON-тела изменяющих запросов до этого размера попадают в лог api.requests,
+# чтобы replay_traffic воспроизводил записи; 0 — не писать тела.
+REQUEST_LOG_BODY_MAX_SIZE = int(os.getenv('REQUEST_LOG_BODY_MAX_SIZE', 4096))
+
+# Бюджет SQL-запросов на запрос по имени маршрута. 'warn' пишет
+# предупреждение в лог, 'raise' бросает исключение (так делает тест-раннер).
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'warn')
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 20))
+# Ключ — имя маршрута или "МЕТОД имя", если методы сильно различаются.
+# Значения — замеренное число запросов плюс один на JWT-аутентификацию.
+QUERY_BUDGETS = {
+    'category-list': 3,
+    'category-detail': 3,
+    'product-list': 5,
+    'product-detail': 4,
+    'product-by-category-slug': 6,
+    'image-list': 2,
+    'image-detail': 2,
+    'POST image-list': 9,
+    'reviews-list': 4,
+    'POST reviews-list': 7,
+    'cart-list': 4,
+    'cart-add': 10,
+    'cart-decrease': 4,
+    'cart-remove': 4,
+    'cart-clear': 4,
+    'cart-bulk': 14,
+    'cart-apply-promo': 6,
+    'cart-remove-promo': 5,
+    'order-list': 3,
+    'order-detail': 3,
+    'order-create-from-cart': 11,
+    'promocode-current': 3,
+    'promocode-has-attempt': 2,
+}
+
+TEST_RUNNER = 'food_backend.test_runner.QueryBudgetTestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
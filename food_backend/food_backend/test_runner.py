@@ -0,0 +1,17 @@
+import logging
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """В тестах превышение бюджета SQL-запросов роняет запрос."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_MODE = 'raise'
+        # Варианты картинок строятся в том же потоке: фоновые потоки
+        # пишут в базу во время чужих тестов.
+        settings.IMAGE_VARIANTS_ASYNC = False
+        # Строка лога на каждый запрос только зашумляет вывод тестов.
+        logging.getLogger('api.requests').setLevel(logging.WARNING)
@@ -0,0 +1,47 @@
+"""Настройки gunicorn.
+
+Метрики Prometheus собираются со всех воркеров через файлы в
+``PROMETHEUS_MULTIPROC_DIR``: каталог очищается при старте мастера,
+а файлы завершившихся воркеров помечаются, чтобы их gauge не учитывались.
+Переменная задается здесь, до импорта prometheus_client (он выбирает
+хранилище значений при импорте), и наследуется воркерами. В Dockerfile
+ее нет: остальные процессы образа (``manage.py``, ``promo-reaper``)
+пишут метрики в память и не зависят от каталога, который создает мастер.
+
+Кэши по умолчанию — LocMem, свой в каждом процессе. Больше одного воркера
+(``GUNICORN_WORKERS``) можно запускать только с общим бэкендом кэшей
+(``DEFAULT_CACHE_BACKEND``, ``CATALOG_CACHE_BACKEND``,
+``REQUEST_STATS_CACHE_BACKEND``), например memcached или redis.
+"""
+import os
+import shutil
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+from prometheus_client import multiprocess  # noqa: E402
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+CACHE_BACKEND_VARIABLES = (
+    'DEFAULT_CACHE_BACKEND', 'CATALOG_CACHE_BACKEND', 'REQUEST_STATS_CACHE_BACKEND'
+)
+
+bind = '0.0.0.0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+if workers > 1:
+    local = [name for name in CACHE_BACKEND_VARIABLES if os.getenv(name, LOCMEM) == LOCMEM]
+    if local:
+        raise RuntimeError(
+            f'GUNICORN_WORKERS={workers} требует общего кэша, '
+            f'а {", ".join(local)} — LocMem.'
+        )
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
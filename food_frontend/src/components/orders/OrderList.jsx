@@ -3,13 +3,22 @@ import api from '../../services/api';
 
 export default function Orders() {
   const [orders, setOrders] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
 
+  const fetchOrders = (cursor = null) => {
+    const params = cursor ? { cursor } : {};
+    return api.get('/orders/', { params })
+      .then(res => {
+        setOrders(prev => (cursor ? [...prev, ...res.data.results] : res.data.results));
+        const next = res.data.next ? new URL(res.data.next).searchParams.get('cursor') : null;
+        setNextCursor(next);
+      })
+      .catch(err => console.error('Ошибка при загрузке заказов:', err));
+  };
+
   useEffect(() => {
-    api.get('/orders/')
-      .then(res => setOrders(res.data))
-      .catch(err => console.error('Ошибка при загрузке заказов:', err))
-      .finally(() => setLoading(false));
+    fetchOrders().finally(() => setLoading(false));
   }, []);
 
   if (loading) return <p className="text-center mt-5">Загрузка заказов...</p>;
@@ -55,6 +64,12 @@ export default function Orders() {
           </div>
         </div>
       ))}
+
+      {nextCursor && (
+        <button className="btn btn-outline-primary mb-4" onClick={() => fetchOrders(nextCursor)}>
+          Показать еще
+        </button>
+      )}
     </div>
   );
 }
@@ -11,6 +11,8 @@ export default function ProductDetail() {
 
   const [product, setProduct] = useState(null);
   const [reviews, setReviews] = useState([]);
+  const [reviewsCursor, setReviewsCursor] = useState(null);
+  const [ratingDistribution, setRatingDistribution] = useState({});
   const [newReview, setNewReview] = useState('');
   const [newRating, setNewRating] = useState(5);
   const [editingReviewId, setEditingReviewId] = useState(null);
@@ -25,12 +27,20 @@ export default function ProductDetail() {
     loadReviews();
   }, [id]);
 
-  const loadReviews = () => {
-    api.get(`/products/${id}/reviews/`)
-      .then(res => setReviews(res.data))
+  const loadReviews = (cursor = null) => {
+    const params = cursor ? { cursor } : {};
+    api.get(`/products/${id}/reviews/`, { params })
+      .then(res => {
+        setReviews(prev => (cursor ? [...prev, ...res.data.results] : res.data.results));
+        const next = res.data.next ? new URL(res.data.next).searchParams.get('cursor') : null;
+        setReviewsCursor(next);
+        setRatingDistribution(res.data.rating_distribution);
+      })
       .catch(err => console.error('Ошибка загрузки отзывов:', err));
   };
 
+  const reviewsCount = Object.values(ratingDistribution).reduce((sum, count) => sum + count, 0);
+
   const handleAddReview = () => {
     if (!newReview.trim()) return;
 
@@ -121,7 +131,7 @@ export default function ProductDetail() {
           }}
         >
           <img
-            src={product.images[0].image}
+            src={product.images[0].variants?.detail?.url || product.images[0].image}
             alt={product.name}
             style={{
               width: '100%',
@@ -192,7 +202,17 @@ export default function ProductDetail() {
       )}
 
       <div className="mt-5">
-        <h3 className="mb-4">Отзывы ({reviews.length})</h3>
+        <h3 className="mb-4">Отзывы ({reviewsCount})</h3>
+
+        {reviewsCount > 0 && (
+          <ul className="list-unstyled mb-4">
+            {[5, 4, 3, 2, 1].map(rating => (
+              <li key={rating}>
+                {rating}★ — {ratingDistribution[rating]}
+              </li>
+            ))}
+          </ul>
+        )}
 
         {user && (
           <div className="mb-4 p-3 border rounded shadow-sm bg-light">
@@ -312,6 +332,12 @@ export default function ProductDetail() {
             ))}
           </div>
         )}
+
+        {reviewsCursor && (
+          <button className="btn btn-outline-primary mb-4" onClick={() => loadReviews(reviewsCursor)}>
+            Показать еще
+          </button>
+        )}
       </div>
     </div>
   );
@@ -28,7 +28,7 @@ export default function ProductItem({ product }) {
               {product.images.map((image, index) => (
                 <img
                   key={index}
-                  src={image.image}
+                  src={image.variants?.card?.url || image.image}
                   alt={`Изображение ${product.name} ${index + 1}`}
                   className={styles.image}
                 />
@@ -8,13 +8,24 @@ export default function ProductsByCategory() {
   const { category_slug } = useParams();
   const location = useLocation();
   const [products, setProducts] = useState([]);
+  const [nextOffset, setNextOffset] = useState(null);
 
   const categoryName = location.state?.categoryName || category_slug;
 
-  useEffect(() => {
-    api.get(`/products/category/${category_slug}/`)
-      .then(res => setProducts(res.data))
+  const fetchProducts = (offset = null) => {
+    const params = offset ? { offset } : {};
+    return api.get(`/products/category/${category_slug}/`, { params })
+      .then(res => {
+        const results = res.data.results || [];
+        setProducts(prev => (offset ? [...prev, ...results] : results));
+        const next = res.data.next ? new URL(res.data.next).searchParams.get('offset') : null;
+        setNextOffset(next);
+      })
       .catch(err => console.error('Ошибка загрузки статей по категории:', err));
+  };
+
+  useEffect(() => {
+    fetchProducts();
   }, [category_slug]);
 
   return (
@@ -36,6 +47,11 @@ export default function ProductsByCategory() {
               ))}
             </div>
           )}
+          {nextOffset && (
+            <button className="btn btn-outline-primary mb-4" onClick={() => fetchProducts(nextOffset)}>
+              Показать еще
+            </button>
+          )}
         </div>
       </div>
     </div>